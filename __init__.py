@@ -1,8 +1,12 @@
 import bpy
 
 from .operators import OP_OT_ClearScene
+from .operators import OP_OT_EstimateDataset
+from .operators import OP_OT_ExportTensors
 from .operators import OP_OT_GenerateDataset
 from .operators import OP_OT_GenerateScene
+from .operators import OP_OT_RepairDataset
+from .operators import OP_OT_VerifyDataset
 from .panels import PL_PT_file
 from .panels import PL_PT_generator
 from .panels import PL_PT_gui
@@ -29,6 +33,10 @@ classes = (
     PL_PT_file,
     PL_PT_generator,
     OP_OT_GenerateDataset,
+    OP_OT_EstimateDataset,
+    OP_OT_ExportTensors,
+    OP_OT_VerifyDataset,
+    OP_OT_RepairDataset,
 )
 
 
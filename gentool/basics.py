@@ -2,8 +2,22 @@ from typing import List
 
 
 class Environment:
-    def __init__(self, dimension: int = 0):
+    def __init__(self,
+                 dimension: int = 0,
+                 hdris: List[str] = None,
+                 clutter: int = 0,
+                 clutter_models: int = 1,
+                 clutter_scale: float = 0.3):
+        # HDRIs for the environment lighting, one of them is picked at random
+        # for each render. The default HDRI is used if there is none.
         self.dimension = dimension
+        self.hdris = hdris or []
+        # Clutter scenes: amount of instances placed around the object with a
+        # random pose in each viewpoint, taken from clutter_models models (the
+        # object and the next ones of the config). 0 renders the object alone.
+        self.clutter = clutter
+        self.clutter_models = clutter_models
+        self.clutter_scale = clutter_scale
 
 
 class Material:
@@ -22,14 +36,23 @@ class Material:
     def __init__(self,
                  kind: str = "",
                  texture: str = "",
-                 metallic: float = .0,
-                 specular: float = .0,
-                 roughness: float = .0
+                 metallic: float = None,
+                 specular: float = None,
+                 roughness: float = None,
+                 hue: float = None,
+                 scale: float = None
                  ):
+        # metallic, specular, roughness, hue and scale could be a value, a
+        # list or a range (see sweep.Sweep). None keeps the loaded material
+        # value, or it's sampled at random with the DYNAMIC_PARAMS kinds.
+        # hue is the base color hue, 0.5 keeps it; scale multiplies the
+        # texture coordinates.
         self.kind = kind
         self.metallic = metallic
         self.specular = specular
         self.roughness = roughness
+        self.hue = hue
+        self.scale = scale
         self.texture = texture
 
     def static_texture_and_params(self,
@@ -60,15 +83,25 @@ class Material:
 
 
 class Object:
+    class Format:
+        OBJ = "obj"
+        PLY = "ply"
+        NPZ = "npz"
+
     def __init__(self,
                  name: str,
                  path: str,
                  material: Material,
-                 normalize: bool = True):
+                 normalize: bool = True,
+                 export_format: str = Format.OBJ,
+                 companions: List[str] = None):
         self.name = name
         self.path = path
         self.normalize = normalize
         self.material = material
+        self.export_format = export_format
+        # Paths of the other models of a clutter scene.
+        self.companions = companions or []
 
 
 class Light:
@@ -83,7 +116,7 @@ class Light:
                  color: list = None,
                  location: list = None,
                  max_range: int = 0,
-                 max_energy: int = 10
+                 max_energy: int = 1000
                  ):
         self.kind = kind
         self.color = color
@@ -135,6 +168,11 @@ class Viewpoint:
         STATIC_CAMERA = "static_camera"
         DYNAMIC_CAMERA = "dynamic_camera"
         OBJECT_PATH = "object_path"
+        CAMERA_RIG = "camera_rig"
+
+    class Rig:
+        STEREO = "stereo"
+        RING = "ring"
 
     def __init__(self, kind: str = "",
                  location: list = None,
@@ -142,7 +180,10 @@ class Viewpoint:
                  size: int = 0,
                  horizontal_divisions: int = 0,
                  vertical_divisions: int = 0,
-                 max_range: int = 0
+                 max_range: int = 0,
+                 rig: str = "",
+                 rig_cameras: int = 0,
+                 baseline: float = 0.0
                  ):
         self.max_range = max_range
         self.location = location
@@ -151,6 +192,27 @@ class Viewpoint:
         self.size = size
         self.vertical_divisions = vertical_divisions
         self.horizontal_divisions = horizontal_divisions
+        # CAMERA_RIG: every one of the amount poses is the center of a rig
+        # of cameras that see the same scene.
+        self.rig = rig
+        self.rig_cameras = rig_cameras
+        self.baseline = baseline
+        if kind == self.Kind.CAMERA_RIG:
+            self.check_rig()
+
+    def check_rig(self):
+        assert self.rig in (self.Rig.STEREO, self.Rig.RING), "rig must be stereo or ring"
+        assert self.rig == self.Rig.STEREO or self.rig_cameras > 0, "a ring needs cameras"
+        assert self.rig == self.Rig.RING or self.baseline > 0, "a stereo rig needs a baseline"
+
+    @property
+    def rig_size(self) -> int:
+        """
+        Amount of cameras of each pose.
+        """
+        if self.kind != self.Kind.CAMERA_RIG:
+            return 1
+        return 2 if self.rig == self.Rig.STEREO else self.rig_cameras
 
     def static_camera_viewpoint(self,
                                 location: List,
@@ -168,6 +230,18 @@ class Viewpoint:
 
         return self
 
+    def camera_rig_viewpoint(self, rig: str, amount: int, max_range: int, rig_cameras: int = 2,
+                             baseline: float = 0.1):
+        self.kind = self.Kind.CAMERA_RIG
+        self.rig = rig
+        self.amount = amount
+        self.max_range = max_range
+        self.rig_cameras = rig_cameras
+        self.baseline = baseline
+        self.check_rig()
+
+        return self
+
     def espheric_path_viewpoint(self,
                                 size: int,
                                 horizontal_divisions: int,
@@ -187,9 +261,34 @@ class Render:
         TEXTURE_SEGMENTATION = "texture-segmentation"
         RAY_TRACED = "ray-traced"
         RASTERED = "rastered"
+        INSTANCE_SEGMENTATION = "instance-segmentation"
+
+    # Render samples used for each style.
+    SAMPLES = {
+        Style.NORMAL: 100,
+        Style.SILHOUETTE: 100,
+        Style.TEXTURE_SEGMENTATION: 100,
+        Style.RAY_TRACED: 128,
+        Style.RASTERED: 100,
+        Style.INSTANCE_SEGMENTATION: 100,
+    }
 
-    def __init__(self, resolution_x: int, resolution_y: int, output_dir_path: str, styles: List[str]):
+    def __init__(self,
+                 resolution_x: int,
+                 resolution_y: int,
+                 output_dir_path: str,
+                 styles: List[str],
+                 animation: bool = False,
+                 resolutions: List[List[int]] = None):
         self.resolution_x = resolution_x
         self.resolution_y = resolution_y
         self.output_dir_path = output_dir_path
         self.styles = styles
+        # Render the viewpoints of a batch as the frames of an animation, with
+        # a single render call per style.
+        self.animation = animation
+        # Smaller copies [width, height] of every image, made from the render
+        # at resolution_x x resolution_y.
+        self.resolutions = [list(r) for r in resolutions or []]
+        assert all(0 < w <= resolution_x and 0 < h <= resolution_y for w, h in self.resolutions), \
+            "resolutions can not be bigger than the render resolution!"
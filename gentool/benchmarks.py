@@ -0,0 +1,85 @@
+import json
+import os
+
+from typing import Dict, Optional
+
+from .basics import Render
+
+
+class Benchmarks:
+    """
+    Per style render timings and output sizes. The defaults are rough values
+    for a GPU at 100/128 samples, a run records the measured ones so later
+    estimates can use them.
+    """
+    SETUP = "setup"  # seconds per image, regardless of the resolution.
+    PER_MEGAPIXEL = "per_megapixel"  # seconds per megapixel at the style samples.
+    BYTES_PER_PIXEL = "bytes_per_pixel"  # PNG size.
+    MEASURES = "measures"
+
+    DEFAULTS = {
+        Render.Style.NORMAL: {SETUP: 0.3, PER_MEGAPIXEL: 0.5, BYTES_PER_PIXEL: 1.2},
+        Render.Style.SILHOUETTE: {SETUP: 0.2, PER_MEGAPIXEL: 0.2, BYTES_PER_PIXEL: 0.05},
+        Render.Style.TEXTURE_SEGMENTATION: {SETUP: 0.2, PER_MEGAPIXEL: 0.2, BYTES_PER_PIXEL: 0.05},
+        Render.Style.RAY_TRACED: {SETUP: 0.5, PER_MEGAPIXEL: 4.0, BYTES_PER_PIXEL: 1.5},
+        Render.Style.RASTERED: {SETUP: 0.3, PER_MEGAPIXEL: 0.8, BYTES_PER_PIXEL: 1.3},
+        Render.Style.INSTANCE_SEGMENTATION: {SETUP: 0.2, PER_MEGAPIXEL: 0.2, BYTES_PER_PIXEL: 0.08},
+    }
+
+    def __init__(self, timings: Optional[Dict] = None):
+        self.timings = {style: dict(values) for style, values in Benchmarks.DEFAULTS.items()}
+        for style, values in (timings or {}).items():
+            self.timings.setdefault(style, {}).update(values)
+
+    @staticmethod
+    def load(path: Optional[str]) -> 'Benchmarks':
+        """
+        Load benchmarks from a json file, defaults are used if there is no file.
+        :param path: json path.
+        """
+        if not path or not os.path.isfile(path):
+            return Benchmarks()
+        with open(path, "r") as fr:
+            return Benchmarks(json.load(fr))
+
+    def save(self, path: str):
+        with open(path, "w") as fw:
+            fw.write(json.dumps(self.timings, indent=4, sort_keys=True))
+
+    def seconds(self, style: str, resolution_x: int, resolution_y: int, samples: int) -> float:
+        """
+        Predicted seconds to render one image.
+        """
+        timing = self.timings[style]
+        megapixels = resolution_x * resolution_y / 1e6
+        return timing[Benchmarks.SETUP] + timing[Benchmarks.PER_MEGAPIXEL] * megapixels * \
+            samples / Render.SAMPLES.get(style, samples)
+
+    def bytes(self, style: str, resolution_x: int, resolution_y: int) -> int:
+        """
+        Predicted size of one image.
+        """
+        return int(self.timings[style][Benchmarks.BYTES_PER_PIXEL] * resolution_x * resolution_y)
+
+    def record(self, style: str, seconds: float, size: int, resolution_x: int, resolution_y: int):
+        """
+        Update the style timings with a measured render, as a running mean.
+        :param style: render style.
+        :param seconds: measured render time.
+        :param size: output image size in bytes.
+        """
+        timing = self.timings.setdefault(style, dict(Benchmarks.DEFAULTS.get(style, {})))
+        pixels = resolution_x * resolution_y
+        if pixels == 0:
+            return
+
+        measures = timing.get(Benchmarks.MEASURES, 0)
+        per_megapixel = max(seconds - timing.get(Benchmarks.SETUP, 0), 0) / (pixels / 1e6)
+        bytes_per_pixel = size / pixels
+
+        def mean(key, value):
+            return (timing.get(key, value) * measures + value) / (measures + 1)
+
+        timing[Benchmarks.PER_MEGAPIXEL] = mean(Benchmarks.PER_MEGAPIXEL, per_megapixel)
+        timing[Benchmarks.BYTES_PER_PIXEL] = mean(Benchmarks.BYTES_PER_PIXEL, bytes_per_pixel)
+        timing[Benchmarks.MEASURES] = measures + 1
@@ -0,0 +1,123 @@
+import glob
+import hashlib
+import os
+
+from typing import Iterator
+
+from .basics import Object, Material
+
+
+class Catalog:
+    """
+    A lazy collection of models, it can be used as Config objects.
+    The source could be a directory (walked recursively), a glob pattern or a
+    manifest file with one model path per line. Paths are enumerated on demand,
+    so the Object instances are never held in memory all together.
+    """
+    EXTENSIONS = ('.obj', '.ply', '.stl', '.gltf', '.glb')
+    MANIFEST_EXTENSIONS = ('.txt', '.lst')
+    COMMENT = '#'
+    HASH_SIZE = 10
+
+    def __init__(self,
+                 source: str,
+                 material: Material,
+                 normalize: bool = True,
+                 export_format: str = Object.Format.OBJ):
+        self.source = source
+        self.material = material
+        self.normalize = normalize
+        self.export_format = export_format
+
+    @staticmethod
+    def is_catalog(source: str) -> bool:
+        """
+        Check if a path should be treated as a catalog instead of a single model.
+        :param source: the path.
+        """
+        _, extension = os.path.splitext(source)
+        return os.path.isdir(source) or glob.has_magic(source) or extension in Catalog.MANIFEST_EXTENSIONS
+
+    def root(self) -> str:
+        """
+        Directory used to derive the models names.
+        """
+        if os.path.isdir(self.source):
+            return self.source
+        if glob.has_magic(self.source):
+            # The root is the longest prefix without wildcards.
+            parts = []
+            for part in self.source.split(os.sep):
+                if glob.has_magic(part):
+                    break
+                parts.append(part)
+            return os.sep.join(parts)
+        return os.path.dirname(self.source)
+
+    def _walk(self) -> Iterator[str]:
+        for dir_path, dir_names, file_names in os.walk(self.source):
+            dir_names.sort()  # walk in a stable order
+            for file_name in sorted(file_names):
+                if os.path.splitext(file_name)[1].lower() in Catalog.EXTENSIONS:
+                    yield os.path.join(dir_path, file_name)
+
+    def _manifest(self) -> Iterator[str]:
+        root = self.root()
+        with open(self.source, "r") as fr:
+            for line in fr:
+                line = line.strip()
+                if not line or line.startswith(Catalog.COMMENT):
+                    continue
+                yield os.path.join(root, line)
+
+    def paths(self) -> Iterator[str]:
+        """
+        Enumerate the models paths of the catalog.
+        """
+        assert os.path.exists(self.source) or glob.has_magic(self.source), "Not such file or directory!"
+
+        if os.path.isdir(self.source):
+            yield from self._walk()
+        elif glob.has_magic(self.source):
+            # Only the paths are sorted, so the order is the same between runs.
+            yield from sorted(p for p in glob.iglob(self.source, recursive=True)
+                              if os.path.splitext(p)[1].lower() in Catalog.EXTENSIONS)
+        else:
+            yield from self._manifest()
+
+    def name_of(self, path: str) -> str:
+        """
+        Stable name of a model, derived from its path relative to the catalog root.
+        For example "chairs/ikea/model.obj" is named "chairs_ikea_model".
+        Paths the name can not be read back from ("chairs_ikea/model.obj",
+        "chairs/ikea/model.ply", "../model.obj") get a hash of the path as
+        suffix, so two models never share a folder.
+        :param path: model path.
+        """
+        relative = os.path.relpath(path, self.root() or os.curdir)
+        stem, extension = os.path.splitext(relative)
+        parts = stem.split(os.sep)
+        name = "_".join(parts).replace(os.pardir, "up")
+
+        if extension.lower() != Catalog.EXTENSIONS[0] or any("_" in part or part == os.pardir for part in parts):
+            name += "_" + hashlib.sha1(relative.replace(os.sep, "/").encode("utf-8")).hexdigest()[:Catalog.HASH_SIZE]
+        return name
+
+    def count(self) -> int:
+        """
+        Amount of models of the catalog, without creating any Object.
+        """
+        return sum(1 for _ in self.paths())
+
+    def __iter__(self) -> Iterator[Object]:
+        empty = True
+        for path in self.paths():
+            empty = False
+            yield Object(
+                name=self.name_of(path),
+                path=path,
+                material=Material(**self.material.__dict__),
+                normalize=self.normalize,
+                export_format=self.export_format
+            )
+        assert not empty, f"No models found in {self.source}!"
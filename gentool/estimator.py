@@ -0,0 +1,92 @@
+from typing import Dict
+
+from .basics import Render, Viewpoint
+from .benchmarks import Benchmarks
+from .translator import Config
+
+
+def count_viewpoints(v: Viewpoint) -> int:
+    """
+    Amount of poses of a viewpoint, without creating it.
+    The UV sphere has a vertex per segment in each inner ring plus the poles.
+    """
+    if v.kind in (Viewpoint.Kind.STATIC_CAMERA, Viewpoint.Kind.DYNAMIC_CAMERA):
+        return v.amount
+    if v.kind == Viewpoint.Kind.OBJECT_PATH:
+        return v.horizontal_divisions * (v.vertical_divisions - 1) + 2
+    if v.kind == Viewpoint.Kind.CAMERA_RIG:
+        return v.amount * v.rig_size
+    return 0
+
+
+class Estimate:
+    def __init__(self, objects: int, viewpoints: int, images: Dict[str, int],
+                 seconds: Dict[str, float], sizes: Dict[str, int]):
+        self.objects = objects
+        self.viewpoints = viewpoints
+        self.images = images
+        self.seconds = seconds
+        self.sizes = sizes
+
+    @property
+    def total_images(self) -> int:
+        return sum(self.images.values())
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(self.seconds.values())
+
+    @property
+    def total_size(self) -> int:
+        return sum(self.sizes.values())
+
+    def __str__(self):
+        lines = [f"{self.objects} objects x {self.viewpoints} viewpoints"]
+        for style in self.images:
+            lines.append(f"{style}: {self.images[style]} images, "
+                         f"{format_seconds(self.seconds[style])}, {format_size(self.sizes[style])}")
+        lines.append(f"Total: {self.total_images} images, "
+                     f"{format_seconds(self.total_seconds)}, {format_size(self.total_size)}")
+        return "\n".join(lines)
+
+
+def format_seconds(seconds: float) -> str:
+    hours, rest = divmod(int(seconds), 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{hours}h {minutes:02d}m {seconds:02d}s"
+
+
+def format_size(size: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+class Estimator:
+    @staticmethod
+    def estimate(config: Config, benchmarks: Benchmarks, preview: bool = False) -> Estimate:
+        """
+        Dry-run a config: count the images it produces per style and predict
+        the render time and the disk usage, without rendering anything.
+        :param config: the Config
+        :param benchmarks: timings to predict with.
+        :param preview: if true, only 1 viewpoint is rendered.
+        """
+        objects = len(config.objects) if isinstance(config.objects, list) else config.objects.count()
+        if config.environment.clutter and config.environment.clutter_models > 1:
+            # Each clutter scene takes several objects.
+            objects = -(-objects // config.environment.clutter_models)
+        viewpoints = 1 if preview else sum(count_viewpoints(v) for v in config.viewpoints)
+
+        r = config.render
+        images, seconds, sizes = {}, {}, {}
+        for style in r.styles:
+            images[style] = objects * viewpoints
+            seconds[style] = images[style] * benchmarks.seconds(
+                style, r.resolution_x, r.resolution_y, Render.SAMPLES.get(style, 0)
+            )
+            sizes[style] = images[style] * benchmarks.bytes(style, r.resolution_x, r.resolution_y)
+
+        return Estimate(objects, viewpoints, images, seconds, sizes)
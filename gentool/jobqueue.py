@@ -0,0 +1,386 @@
+import json
+import os
+import socket
+import sqlite3
+import time
+
+from threading import Event, Thread
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .basics import Object
+from .planner import JobPlanner, job_dtype
+from .translator import reconstruct, snapshot
+
+
+class JobQueue:
+    """
+    Render jobs stored in a SQLite file, shared by several worker processes.
+    A row is a rig of an object with the jobs of all its viewpoints and styles,
+    a single viewpoint unless it is a camera rig, whose cameras share the
+    samples and are rendered together. Workers claim rows with a
+    time-limited lease and mark them done after rendering;
+    rows whose lease expired are available to be claimed again, so workers
+    can be added or killed at any time.
+    """
+    PENDING = 0
+    LEASED = 1
+    DONE = 2
+
+    LEASE_SECONDS = 900
+    TIMEOUT = 60
+
+    # Meta keys.
+    FILLER = "filler"
+    FILL_UNTIL = "fill_until"
+    FILLED_OBJECTS = "filled_objects"
+    FILLED = "filled"
+    SEED = "seed"
+    TEXTURES = "textures"
+    STYLES = "styles"
+    LIGHTS = "lights"
+    INSTANCES = "instances"
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE TABLE IF NOT EXISTS objects (
+            id INTEGER PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY,
+            object INTEGER NOT NULL,
+            -- first viewpoint of the rig.
+            viewpoint INTEGER NOT NULL,
+            status INTEGER NOT NULL DEFAULT 0,
+            worker TEXT,
+            lease_until REAL NOT NULL DEFAULT 0,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            data BLOB NOT NULL,
+            UNIQUE (object, viewpoint)
+        );
+        CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_until);
+    """
+
+    def __init__(self, path: str, lease_seconds: float = LEASE_SECONDS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        # Autocommit mode, transactions are opened explicitly.
+        self.connection = sqlite3.connect(path, timeout=JobQueue.TIMEOUT, isolation_level=None)
+        self.connection.executescript(JobQueue.SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def _transaction(self):
+        """
+        Context of a write transaction, taken before reading so two workers
+        never claim the same rows.
+        """
+        queue = self
+
+        class Transaction:
+            def __enter__(self):
+                queue.connection.execute("BEGIN IMMEDIATE")
+                return queue.connection
+
+            def __exit__(self, exc_type, *_):
+                queue.connection.execute("ROLLBACK" if exc_type else "COMMIT")
+
+        return Transaction()
+
+    def _set_meta(self, connection, key: str, value):
+        connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def meta(self) -> Dict:
+        return {key: json.loads(value) for key, value in self.connection.execute("SELECT key, value FROM meta")}
+
+    def fill(self, planner: JobPlanner, filler: Optional[str] = None) -> Optional[Iterator[int]]:
+        """
+        Take the filling of the queue. Only one process fills it at a time,
+        inserting an object at each step of the returned iterator, so it can
+        render between steps. A filling that is not renewed for a lease is
+        taken over by the next call, after the last object it inserted.
+        :param planner: the JobPlanner
+        :param filler: the filler name.
+        :return: iterator of the inserted objects ids, None if the queue is
+        filled or another process is filling it.
+        """
+        filler = filler or worker_name()
+        with self._transaction() as connection:
+            meta = {key: json.loads(value) for key, value in connection.execute("SELECT key, value FROM meta")}
+            if meta.get(JobQueue.FILLED):
+                return None
+            if meta.get(JobQueue.FILLER) and meta.get(JobQueue.FILL_UNTIL, 0) >= time.time():
+                return None
+            if JobQueue.FILLER in meta:
+                print(f"{filler} takes over the queue filling from {meta[JobQueue.FILLER]}")
+
+            self._set_meta(connection, JobQueue.FILLER, filler)
+            self._set_meta(connection, JobQueue.FILL_UNTIL, time.time() + self.lease_seconds)
+            self._set_meta(connection, JobQueue.STYLES, planner.styles)
+            self._set_meta(connection, JobQueue.LIGHTS, len(planner.config.lights))
+            self._set_meta(connection, JobQueue.INSTANCES, planner.config.environment.clutter)
+            # The jobs already in the queue keep their textures ids, and the
+            # objects left are sampled as the first filler would have.
+            planner.textures = meta.get(JobQueue.TEXTURES, [])
+            self._set_meta(connection, JobQueue.TEXTURES, planner.textures)
+            if JobQueue.SEED in meta:
+                planner.reseed(meta[JobQueue.SEED])
+            self._set_meta(connection, JobQueue.SEED, planner.seed)
+
+        return self._fill(planner, filler, meta.get(JobQueue.FILLED_OBJECTS, 0))
+
+    def _fill(self, planner: JobPlanner, filler: str, skip: int) -> Iterator[int]:
+        def owned(connection) -> bool:
+            # Every write checks the filling was not taken over.
+            value = connection.execute("SELECT value FROM meta WHERE key = ?", (JobQueue.FILLER,)).fetchone()
+            return value is not None and json.loads(value[0]) == filler
+
+        for object_id, (obj, batches) in enumerate(planner.object_jobs()):
+            if object_id < skip:
+                # Expanded anyway, the random stream goes on from the same point.
+                for _ in batches:
+                    pass
+                continue
+
+            with self._transaction() as connection:
+                if not owned(connection):
+                    return
+                connection.execute("INSERT OR IGNORE INTO objects (id, data) VALUES (?, ?)",
+                                   (object_id, json.dumps(snapshot(obj))))
+
+            for jobs in batches:
+                # A batch never splits a rig, its viewpoints are consecutive.
+                bounds = np.flatnonzero(np.diff(jobs['rig'])) + 1
+                rows = [
+                    (object_id, int(rig_jobs['viewpoint'][0]), rig_jobs.tobytes())
+                    for rig_jobs in np.split(jobs, bounds)
+                ]
+                # The textures vocabulary is saved with the jobs that use it.
+                with self._transaction() as connection:
+                    if not owned(connection):
+                        return
+                    connection.executemany(
+                        "INSERT OR IGNORE INTO jobs (object, viewpoint, data) VALUES (?, ?, ?)", rows
+                    )
+                    self._set_meta(connection, JobQueue.TEXTURES, planner.textures)
+                    self._set_meta(connection, JobQueue.FILL_UNTIL, time.time() + self.lease_seconds)
+
+            with self._transaction() as connection:
+                if not owned(connection):
+                    return
+                self._set_meta(connection, JobQueue.FILLED_OBJECTS, object_id + 1)
+            yield object_id
+
+        with self._transaction() as connection:
+            if owned(connection):
+                self._set_meta(connection, JobQueue.FILLED, True)
+
+    def renew_fill(self, filler: str):
+        """
+        Extend the filling lease, if the filler still has it.
+        """
+        with self._transaction() as connection:
+            value = connection.execute("SELECT value FROM meta WHERE key = ?", (JobQueue.FILLER,)).fetchone()
+            if value is not None and json.loads(value[0]) == filler:
+                self._set_meta(connection, JobQueue.FILL_UNTIL, time.time() + self.lease_seconds)
+
+    def claim(self, worker: str, limit: int, object_id: Optional[int] = None) -> List[Tuple[int, int, bytes]]:
+        """
+        Lease up to limit rigs of a single object, pending ones or the ones
+        whose lease expired.
+        :param worker: worker name.
+        :param limit: max amount of rigs.
+        :param object_id: only take jobs of this object, so the worker does
+        not load another model. By default, the first object with jobs left.
+        :return: list of (job id, object, jobs data)
+        """
+        now = time.time()
+        available = "(status = ? OR (status = ? AND lease_until < ?))"
+        params = (JobQueue.PENDING, JobQueue.LEASED, now)
+
+        with self._transaction() as connection:
+            if object_id is None:
+                first = connection.execute(
+                    f"SELECT object FROM jobs WHERE {available} ORDER BY object, viewpoint LIMIT 1", params
+                ).fetchone()
+                if first is None:
+                    return []
+                object_id = first[0]
+
+            rows = connection.execute(
+                f"SELECT id, object, data FROM jobs WHERE object = ? AND {available} ORDER BY viewpoint LIMIT ?",
+                (object_id, *params, limit)
+            ).fetchall()
+            connection.executemany(
+                "UPDATE jobs SET status = ?, worker = ?, lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                [(JobQueue.LEASED, worker, now + self.lease_seconds, row[0]) for row in rows]
+            )
+
+        return rows
+
+    def renew(self, ids: List[int], worker: str):
+        """
+        Extend the lease of jobs still owned by the worker.
+        """
+        with self._transaction() as connection:
+            connection.executemany(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = ?",
+                [(time.time() + self.lease_seconds, i, worker, JobQueue.LEASED) for i in ids]
+            )
+
+    def complete(self, ids: List[int], worker: str):
+        """
+        Mark jobs as done, only the ones still leased by the worker: a job
+        whose lease expired and was claimed again is completed by the new
+        owner, which renders it into the same paths.
+        """
+        with self._transaction() as connection:
+            connection.executemany(
+                "UPDATE jobs SET status = ? WHERE id = ? AND worker = ?",
+                [(JobQueue.DONE, i, worker) for i in ids]
+            )
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Amount of rigs by status, expired leases are counted as pending.
+        """
+        now = time.time()
+        pending, leased, done = self.connection.execute(
+            "SELECT "
+            "SUM(status = ? OR (status = ? AND lease_until < ?)), "
+            "SUM(status = ? AND lease_until >= ?), "
+            "SUM(status = ?) FROM jobs",
+            (JobQueue.PENDING, JobQueue.LEASED, now, JobQueue.LEASED, now, JobQueue.DONE)
+        ).fetchone()
+        return {'pending': pending or 0, 'leased': leased or 0, 'done': done or 0}
+
+    def pending_objects(self) -> int:
+        """
+        Amount of objects with jobs to claim.
+        """
+        return self.connection.execute(
+            "SELECT COUNT(DISTINCT object) FROM jobs WHERE status = ? OR (status = ? AND lease_until < ?)",
+            (JobQueue.PENDING, JobQueue.LEASED, time.time())
+        ).fetchone()[0]
+
+    def object(self, object_id: int) -> Object:
+        data, = self.connection.execute("SELECT data FROM objects WHERE id = ?", (object_id,)).fetchone()
+        return reconstruct(json.loads(data))
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class LeaseHeartbeat(Thread):
+    """
+    Renews the leases of a worker while it renders, a render can take longer
+    than a lease. It has its own connection, sqlite connections are not
+    shared between threads.
+    """
+    def __init__(self, worker: 'QueueWorker'):
+        super().__init__(name='Lease-Heartbeat', daemon=True)
+        self.worker = worker
+        self.stopped = Event()
+
+    def run(self):
+        queue = JobQueue(self.worker.queue.path, self.worker.queue.lease_seconds)
+        try:
+            while not self.stopped.wait(queue.lease_seconds / 3):
+                if self.worker.leased:
+                    queue.renew(self.worker.leased, self.worker.worker)
+                if self.worker.filling is not None:
+                    queue.renew_fill(self.worker.worker)
+        finally:
+            queue.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class QueueWorker:
+    """
+    Jobs source for DatasetsGenerator that claims the jobs from a JobQueue.
+    Jobs are marked done once the generator asks for the next batch. With a
+    planner, the worker also fills the queue when no other process does,
+    keeping a few objects ahead of the claimed ones.
+    """
+    CLAIM_SIZE = 4
+    POLL_SECONDS = 5
+    FILL_AHEAD = 4
+
+    def __init__(self, queue: JobQueue, worker: Optional[str] = None, claim_size: int = CLAIM_SIZE,
+                 planner: Optional[JobPlanner] = None, fill_ahead: int = FILL_AHEAD):
+        self.queue = queue
+        self.worker = worker or worker_name()
+        self.claim_size = claim_size
+        self.planner = planner
+        self.fill_ahead = fill_ahead
+        self.filling: Optional[Iterator[int]] = None
+        # Jobs being rendered, renewed by the heartbeat.
+        self.leased: List[int] = []
+        self.textures = []
+        self.styles = []
+
+    def _refresh(self):
+        meta = self.queue.meta()
+        self.textures = meta.get(JobQueue.TEXTURES, [])
+        self.styles = meta.get(JobQueue.STYLES, [])
+        return meta
+
+    def _fill(self):
+        """
+        Take the filling if nobody has it and insert objects until enough
+        of them are waiting to be claimed.
+        """
+        if self.filling is None and self.planner is not None:
+            self.filling = self.queue.fill(self.planner, self.worker)
+            if self.filling is not None:
+                self.planner.save_seed()
+        while self.filling is not None and self.queue.pending_objects() < self.fill_ahead:
+            if next(self.filling, None) is None:
+                self.filling = None
+
+    def _claim(self, object_id: Optional[int] = None) -> List[Tuple[int, int, bytes]]:
+        self._fill()
+        rows = self.queue.claim(self.worker, self.claim_size, object_id=object_id)
+        self.leased = [job_id for job_id, _, _ in rows]
+        return rows
+
+    def _batches(self, object_id: int, rows: List[Tuple[int, int, bytes]]) -> Iterator[np.ndarray]:
+        meta = self._refresh()
+        dtype = job_dtype(meta.get(JobQueue.LIGHTS, 0), meta.get(JobQueue.INSTANCES, 0))
+        while rows:
+            yield np.concatenate([np.frombuffer(data, dtype=dtype) for _, _, data in rows])
+            self.queue.complete([job_id for job_id, _, _ in rows], self.worker)
+            rows = self._claim(object_id)
+            self._refresh()
+
+    def object_jobs(self) -> Iterator[Tuple[Object, Iterator[np.ndarray]]]:
+        """
+        Claim jobs until the queue is filled and there is nothing left.
+        :return: iterator of (Object, batches of jobs of the object)
+        """
+        heartbeat = LeaseHeartbeat(self)
+        heartbeat.start()
+        try:
+            while True:
+                rows = self._claim()
+                if not rows:
+                    if self._refresh().get(JobQueue.FILLED) and not self.queue.stats()['leased']:
+                        return
+                    # The queue is being filled or other workers could lose their leases.
+                    time.sleep(QueueWorker.POLL_SECONDS)
+                    continue
+
+                object_id = rows[0][1]
+                yield self.queue.object(object_id), self._batches(object_id, rows)
+        finally:
+            heartbeat.stop()
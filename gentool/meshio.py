@@ -0,0 +1,415 @@
+import os
+import re
+
+from typing import List, Tuple
+
+import numpy as np
+
+from .basics import Object
+
+# A mesh as flat buffers: vertices (N, 3) float32, the vertex indices of every
+# polygon one after another and the amount of vertices of each polygon.
+MeshArrays = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+class MeshFormatError(Exception):
+    """
+    The file is not in a format the numpy readers can handle (for example an
+    ASCII PLY/STL), the caller should fall back to the import operators.
+    """
+    pass
+
+
+class PlyReader:
+    MAGIC = b"ply"
+    END_HEADER = b"end_header"
+
+    TYPES = {
+        'char': 'i1', 'int8': 'i1',
+        'uchar': 'u1', 'uint8': 'u1',
+        'short': 'i2', 'int16': 'i2',
+        'ushort': 'u2', 'uint16': 'u2',
+        'int': 'i4', 'int32': 'i4',
+        'uint': 'u4', 'uint32': 'u4',
+        'float': 'f4', 'float32': 'f4',
+        'double': 'f8', 'float64': 'f8',
+    }
+
+    ENDIANNESS = {
+        'binary_little_endian': '<',
+        'binary_big_endian': '>',
+    }
+
+    @staticmethod
+    def read_header(path: str) -> Tuple[str, List[Tuple[str, int, List[tuple]]], int]:
+        """
+        Parse the PLY header.
+        :param path: file path.
+        :return: byte order, elements as (name, count, properties) and the header size in bytes.
+        Properties are (name, type) or (name, count_type, item_type) for lists.
+        """
+        elements = []
+        order = None
+
+        with open(path, "rb") as fr:
+            if fr.readline().strip() != PlyReader.MAGIC:
+                raise MeshFormatError(f"{path} is not a PLY file")
+
+            for line in fr:
+                words = line.decode("ascii", errors="replace").split()
+                if not words or words[0] in ('comment', 'obj_info'):
+                    continue
+                if words[0] == 'format':
+                    if words[1] not in PlyReader.ENDIANNESS:
+                        raise MeshFormatError(f"PLY format '{words[1]}' is not binary")
+                    order = PlyReader.ENDIANNESS[words[1]]
+                elif words[0] == 'element':
+                    elements.append((words[1], int(words[2]), []))
+                elif words[0] == 'property':
+                    if words[1] == 'list':
+                        elements[-1][2].append((words[4], PlyReader.TYPES[words[2]], PlyReader.TYPES[words[3]]))
+                    else:
+                        elements[-1][2].append((words[2], PlyReader.TYPES[words[1]]))
+                elif line.strip() == PlyReader.END_HEADER:
+                    return order, elements, fr.tell()
+
+        raise MeshFormatError(f"{path} has no end_header")
+
+    @staticmethod
+    def _faces(buffer: np.ndarray, offset: int, count: int, properties: List[tuple], order: str):
+        """
+        Read the face element. When all faces have the same amount of vertices
+        (the common case) this is a single structured view over the buffer,
+        otherwise faces are walked one by one.
+        :return: indices, sizes and the offset after the element.
+        """
+        lists = [p for p in properties if len(p) == 3]
+        if len(lists) != 1 or lists[0][0] not in ('vertex_indices', 'vertex_index'):
+            raise MeshFormatError("Only faces with a single vertex_indices list are supported")
+
+        if count == 0:
+            return np.empty(0, np.int32), np.empty(0, np.int32), offset
+
+        def face_dtype(size: int) -> np.dtype:
+            fields = []
+            for p in properties:
+                if len(p) == 3:
+                    fields += [('n', order + p[1]), ('indices', order + p[2], (size,))]
+                else:
+                    fields.append((p[0], order + p[1]))
+            return np.dtype(fields)
+
+        # Guess the size with the first face, then check it holds for all of them.
+        scalar_before = sum(np.dtype(p[1]).itemsize for p in properties[:properties.index(lists[0])])
+        first_size = int(np.frombuffer(buffer, order + lists[0][1], 1, offset + scalar_before)[0])
+        dtype = face_dtype(first_size)
+
+        if offset + dtype.itemsize * count <= buffer.size:
+            faces = np.frombuffer(buffer, dtype, count, offset)
+            if np.all(faces['n'] == first_size):
+                return faces['indices'].astype(np.int32).ravel(), \
+                    np.full(count, first_size, np.int32), offset + dtype.itemsize * count
+
+        if len(properties) != 1:
+            raise MeshFormatError("Mixed polygons with extra face properties are not supported")
+
+        count_type = np.dtype(order + lists[0][1])
+        index_type = np.dtype(order + lists[0][2])
+        sizes = np.empty(count, np.int32)
+        starts = np.empty(count, np.int64)
+        for i in range(count):
+            sizes[i] = np.frombuffer(buffer, count_type, 1, offset)[0]
+            starts[i] = offset + count_type.itemsize
+            offset = int(starts[i]) + int(sizes[i]) * index_type.itemsize
+
+        indices = np.concatenate([
+            np.frombuffer(buffer, index_type, int(n), int(start)) for start, n in zip(starts, sizes)
+        ]).astype(np.int32)
+        return indices, sizes, offset
+
+    @staticmethod
+    def read(path: str) -> MeshArrays:
+        """
+        Read a binary PLY file through a memmap.
+        :param path: file path.
+        :return: vertices, polygon indices and polygon sizes.
+        """
+        order, elements, offset = PlyReader.read_header(path)
+        buffer = np.memmap(path, dtype=np.uint8, mode='r')
+
+        vertices = indices = sizes = None
+        for name, count, properties in elements:
+            if name == 'face':
+                indices, sizes, offset = PlyReader._faces(buffer, offset, count, properties, order)
+                continue
+
+            if any(len(p) == 3 for p in properties):
+                raise MeshFormatError(f"List properties of element '{name}' are not supported")
+
+            dtype = np.dtype([(p[0], order + p[1]) for p in properties])
+            if name == 'vertex':
+                data = np.frombuffer(buffer, dtype, count, offset)
+                vertices = np.column_stack((data['x'], data['y'], data['z'])).astype(np.float32)
+            offset += dtype.itemsize * count
+
+        if vertices is None:
+            raise MeshFormatError(f"{path} has no vertex element")
+        if indices is None:
+            indices, sizes = np.empty(0, np.int32), np.empty(0, np.int32)
+
+        return vertices, indices, sizes
+
+
+class StlReader:
+    HEADER_SIZE = 80
+    DTYPE = np.dtype([
+        ('normal', '<f4', (3,)),
+        ('vertices', '<f4', (3, 3)),
+        ('attributes', '<u2'),
+    ])
+
+    @staticmethod
+    def read(path: str) -> MeshArrays:
+        """
+        Read a binary STL file through a memmap. STL stores every triangle
+        with its own vertices, those are welded.
+        :param path: file path.
+        :return: vertices, polygon indices and polygon sizes.
+        """
+        with open(path, "rb") as fr:
+            fr.seek(StlReader.HEADER_SIZE)
+            raw = fr.read(4)
+
+        if len(raw) != 4:
+            raise MeshFormatError(f"{path} is not a binary STL file")
+
+        count = int(np.frombuffer(raw, '<u4')[0])
+        if os.path.getsize(path) != StlReader.HEADER_SIZE + 4 + StlReader.DTYPE.itemsize * count:
+            # An ASCII STL ("solid ...") does not match the binary size.
+            raise MeshFormatError(f"{path} is not a binary STL file")
+
+        if count == 0:
+            return np.empty((0, 3), np.float32), np.empty(0, np.int32), np.empty(0, np.int32)
+
+        triangles = np.memmap(path, dtype=StlReader.DTYPE, mode='r', offset=StlReader.HEADER_SIZE + 4, shape=(count,))
+        corners = triangles['vertices'].reshape(-1, 3)
+        vertices, indices = np.unique(corners, axis=0, return_inverse=True)
+
+        return vertices.astype(np.float32), indices.astype(np.int32).ravel(), np.full(count, 3, np.int32)
+
+
+class ObjReader:
+    VERTEX = (b'v ', b'v\t')
+    FACE = (b'f ', b'f\t')
+    SMOOTH = (b's ', b's\t')
+    SMOOTH_OFF = (b'off', b'0')
+    CORNER_REFERENCES = re.compile(rb'/\S*')
+
+    # OBJ indices start at 1, so 0 can be used to split the faces.
+    FACE_SEPARATOR = b' 0 '
+
+    @staticmethod
+    def _vertices(lines: List[bytes]) -> np.ndarray:
+        if not lines:
+            return np.empty((0, 3), np.float32)
+
+        values = np.fromstring(b' '.join(lines), dtype=np.float32, sep=' ')
+        width = len(lines[0].split())
+        if width >= 3 and values.size == width * len(lines):
+            return values.reshape(-1, width)[:, :3]
+
+        # Lines with different amount of values (optional w or colors).
+        return np.array([line.split()[:3] for line in lines], dtype=np.float32)
+
+    @staticmethod
+    def _split_faces(joined: bytes, count: int, width: int) -> Tuple[np.ndarray, np.ndarray]:
+        values = np.append(np.fromstring(joined, dtype=np.int64, sep=' '), 0)
+
+        separators = np.flatnonzero(values == 0)
+        lengths = np.diff(np.concatenate(([-1], separators))) - 1
+        if separators.size != count or np.any(lengths % width):
+            raise MeshFormatError("Malformed faces")
+
+        return values[values != 0][::width], lengths // width
+
+    @staticmethod
+    def _faces(lines: List[bytes]) -> Tuple[np.ndarray, np.ndarray]:
+        # Corners could be "v", "v/vt", "v//vn" or "v/vt/vn". When all of them
+        # have the same format every value is parsed and only the first one of
+        # each corner is kept, otherwise the references are removed first.
+        joined = ObjReader.FACE_SEPARATOR.join(lines)
+        first = lines[0].split()[0]
+        width = len(first.replace(b'/', b' ').split())
+
+        # Every line must have the slashes of its corners in the first layout,
+        # a file mixing layouts could otherwise split in the wrong places.
+        corners = np.array([len(line.split()) for line in lines])
+        slashes = np.array([line.count(b'/') for line in lines])
+        if np.array_equal(slashes, corners * first.count(b'/')):
+            try:
+                indices, sizes = ObjReader._split_faces(joined.replace(b'/', b' '), len(lines), width)
+                if np.array_equal(sizes, corners):
+                    return indices, sizes
+            except MeshFormatError:
+                pass
+        return ObjReader._split_faces(ObjReader.CORNER_REFERENCES.sub(b'', joined), len(lines), 1)
+
+    @staticmethod
+    def load(path: str) -> Tuple[MeshArrays, bool]:
+        """
+        Parse the v and f lines of an OBJ file in bulk, all objects and groups
+        are merged into a single mesh and materials are ignored. Vertices are
+        converted from the OBJ Y-up to the blender Z-up axes, as the import
+        operator does.
+        :param path: file path.
+        :return: vertices, polygon indices, polygon sizes and whether the file
+        has smooth groups.
+        """
+        with open(path, "rb") as fr:
+            lines = fr.read().splitlines()
+
+        # Trailing comments, "f 1 2 3 # quad split".
+        lines = [line.split(b'#', 1)[0] if b'#' in line else line for line in lines]
+
+        try:
+            vertices = ObjReader._vertices([line[2:] for line in lines if line[:2] in ObjReader.VERTEX])
+            faces = [line[2:] for line in lines if line[:2] in ObjReader.FACE]
+
+            if not faces:
+                return (vertices, np.empty(0, np.int32), np.empty(0, np.int32)), False
+
+            indices, sizes = ObjReader._faces(faces)
+        except (ValueError, IndexError) as e:
+            raise MeshFormatError(f"{path} has malformed v or f lines: {e}")
+
+        negatives = indices < 0
+        if np.any(negatives):
+            # Relative indices point to the vertices defined before the face.
+            defined, counter = [], 0
+            for line in lines:
+                if line[:2] in ObjReader.VERTEX:
+                    counter += 1
+                elif line[:2] in ObjReader.FACE:
+                    defined.append(counter)
+            defined = np.repeat(defined, sizes)
+            indices[negatives] += defined[negatives] + 1
+
+        indices -= 1
+        if indices.size and (indices.min() < 0 or indices.max() >= len(vertices)):
+            raise MeshFormatError(f"{path} has faces out of the vertices range")
+
+        # OBJ is Y-up: (x, y, z) -> (x, -z, y)
+        vertices = np.column_stack((vertices[:, 0], -vertices[:, 2], vertices[:, 1]))
+
+        smooth = any(line[2:].strip() not in ObjReader.SMOOTH_OFF for line in lines if line[:2] in ObjReader.SMOOTH)
+        return (vertices, indices.astype(np.int32), sizes.astype(np.int32)), smooth
+
+    @staticmethod
+    def read(path: str) -> MeshArrays:
+        """
+        Read an OBJ file.
+        :param path: file path.
+        :return: vertices, polygon indices and polygon sizes.
+        """
+        arrays, _ = ObjReader.load(path)
+        return arrays
+
+
+class MeshWriter:
+    FORMATS = (Object.Format.OBJ, Object.Format.PLY, Object.Format.NPZ)
+    # Next to an exported mesh, the settings it was exported with.
+    STAMP = ".stamp"
+
+    @staticmethod
+    def write_obj(path: str, vertices: np.ndarray, indices: np.ndarray, sizes: np.ndarray):
+        """
+        Write an OBJ file with one formatting call for the vertices and one
+        for the faces. Vertices are converted back to the OBJ Y-up axes.
+        """
+        vertices = np.column_stack((vertices[:, 0], vertices[:, 2], -vertices[:, 1]))
+
+        if sizes.size and np.all(sizes == sizes[0]):
+            face_format = ("f" + " %d" * int(sizes[0]) + "\n") * len(sizes)
+        else:
+            face_format = "".join("f" + " %d" * int(size) + "\n" for size in sizes)
+
+        with open(path, "w") as fw:
+            fw.write("v %.6f %.6f %.6f\n" * len(vertices) % tuple(vertices.ravel().tolist()))
+            fw.write(face_format % tuple((indices + 1).tolist()))
+
+    @staticmethod
+    def write_ply(path: str, vertices: np.ndarray, indices: np.ndarray, sizes: np.ndarray):
+        """
+        Write a binary little endian PLY file. Face counts are stored as int,
+        so counts and indices are interleaved in a single int32 buffer.
+        """
+        header = (
+            "ply\n"
+            "format binary_little_endian 1.0\n"
+            f"element vertex {len(vertices)}\n"
+            "property float x\n"
+            "property float y\n"
+            "property float z\n"
+            f"element face {len(sizes)}\n"
+            "property list int int vertex_indices\n"
+            "end_header\n"
+        )
+
+        starts = np.zeros(len(sizes), dtype=np.int64)
+        np.cumsum(sizes[:-1], out=starts[1:])
+        counts_at = starts + np.arange(len(sizes))
+
+        faces = np.empty(len(sizes) + len(indices), dtype='<i4')
+        faces[counts_at] = sizes
+        mask = np.ones(faces.size, dtype=bool)
+        mask[counts_at] = False
+        faces[mask] = indices
+
+        with open(path, "wb") as fw:
+            fw.write(header.encode("ascii"))
+            fw.write(np.ascontiguousarray(vertices, dtype='<f4').tobytes())
+            fw.write(faces.tobytes())
+
+    @staticmethod
+    def write_npz(path: str, vertices: np.ndarray, indices: np.ndarray, sizes: np.ndarray):
+        """
+        Write the raw buffers to a numpy .npz archive.
+        """
+        with open(path, "wb") as fw:
+            np.savez(fw, vertices=vertices, indices=indices, sizes=sizes)
+
+    @staticmethod
+    def write(path: str, vertices: np.ndarray, indices: np.ndarray, sizes: np.ndarray):
+        """
+        Write a mesh, the format is taken from the path extension.
+        :param path: output path.
+        """
+        extension = os.path.splitext(path)[1].lower().lstrip('.')
+        assert extension in MeshWriter.FORMATS, f"Only {MeshWriter.FORMATS} formats can be exported"
+        getattr(MeshWriter, f"write_{extension}")(path, vertices, indices, sizes)
+
+    @staticmethod
+    def stamp(path: str, settings: str):
+        """
+        Record the settings an exported mesh was made with.
+        :param path: exported mesh path.
+        :param settings: anything the export depends on besides the source.
+        """
+        with open(path + MeshWriter.STAMP, "w") as fw:
+            fw.write(settings)
+
+    @staticmethod
+    def is_fresh(path: str, source: str, settings: str = "") -> bool:
+        """
+        Check if an exported mesh exists, is newer than its source model and
+        was made with the same settings, so the export can be skipped.
+        :param path: exported mesh path.
+        :param source: source model path.
+        :param settings: the settings given to stamp.
+        """
+        if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(source):
+            return False
+        if not os.path.exists(path + MeshWriter.STAMP):
+            return not settings
+        with open(path + MeshWriter.STAMP, "r") as fr:
+            return fr.read() == settings
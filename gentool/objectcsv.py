@@ -0,0 +1,91 @@
+import csv
+import io
+import os
+
+from contextlib import contextmanager
+from typing import List, Set
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows.
+    fcntl = None
+
+try:
+    import msvcrt
+except ImportError:  # Only available on Windows.
+    msvcrt = None
+
+
+class ObjectCsv:
+    """
+    The csv of an object, a row per rendered viewpoint. Workers of a job
+    queue render viewpoints of the same object, so rows are written with the
+    file locked; a viewpoint rendered again (an expired lease, a repair)
+    replaces its row instead of adding a second one.
+    """
+    ENCODING = "utf-8"
+
+    def __init__(self, path: str, header: List[str]):
+        """
+        :param path: csv path.
+        :param header: the columns, the first one is the viewpoint index.
+        """
+        self.path = path
+        self.header = header
+        # Indices in the file up to offset, only the rows appended by other
+        # workers since the last write are read.
+        self.indices: Set[int] = set()
+        self.offset = 0
+
+    @contextmanager
+    def _locked(self):
+        with open(self.path, "a+b") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            elif msvcrt is not None:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield f
+            finally:
+                f.flush()
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                elif msvcrt is not None:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    @staticmethod
+    def _format(rows: List[list]) -> bytes:
+        text = io.StringIO(newline="")
+        csv.writer(text).writerows(rows)
+        return text.getvalue().encode(ObjectCsv.ENCODING)
+
+    @staticmethod
+    def _parse(data: bytes) -> List[List[str]]:
+        return list(csv.reader(io.StringIO(data.decode(ObjectCsv.ENCODING), newline="")))
+
+    def write(self, rows: List[list]):
+        """
+        Add the rows of rendered viewpoints.
+        :param rows: rows starting with the viewpoint index.
+        """
+        with self._locked() as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() < self.offset:  # rewritten by another worker.
+                self.indices, self.offset = set(), 0
+            f.seek(self.offset)
+            self.indices.update(int(row[0]) for row in self._parse(f.read()) if row and row[0] != self.header[0])
+
+            if not any(int(row[0]) in self.indices for row in rows):
+                f.write(self._format(rows if self.indices or f.tell() else [self.header, *rows]))
+            else:
+                f.seek(0)
+                replaced = {int(row[0]): row for row in rows}
+                kept = [row for row in self._parse(f.read())[1:] if row and int(row[0]) not in replaced]
+                f.seek(0)
+                f.truncate()
+                f.write(self._format([self.header, *kept, *rows]))
+
+            self.indices.update(int(row[0]) for row in rows)
+            self.offset = f.tell()
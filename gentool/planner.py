@@ -0,0 +1,419 @@
+import copy
+import itertools
+import json
+import os
+
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .basics import Light, Material, Object, Viewpoint
+from .sweep import Sweep
+from .translator import Config, DataGenFunctsInterface, reconstruct, snapshot
+
+
+# Light params of a job: r, g, b, x, y, z, energy. A light without a known
+# kind is stored as NaN and it's not created.
+LIGHT_PARAMS = 7
+
+# Material params of a job: metallic, specular, roughness, hue and texture
+# scale. NaN keeps the value of the loaded material.
+MATERIAL_PARAMS = 5
+
+# Ranges of the material params sampled for the DYNAMIC_PARAMS kinds.
+MATERIAL_RANGES = np.array([(0, 1), (0, 1), (0, 1), (0, 1), (0.5, 2)], dtype=np.float32)
+
+# Pose of a clutter instance: x, y, z, rotation x, y, z and scale.
+INSTANCE_PARAMS = 7
+
+
+def job_dtype(lights: int, instances: int = 0) -> np.dtype:
+    """
+    Row of the job table, one render of an object viewpoint in one style.
+    :param lights: amount of lights of the config.
+    :param instances: amount of clutter instances of the config.
+    """
+    return np.dtype([
+        ('object', '<i4'),
+        ('viewpoint', '<i4'),
+        ('pose', '<f8', (3,)),
+        ('texture', '<i2'),
+        # Index in the environment HDRIs, -1 for the default one.
+        ('hdri', '<i2'),
+        ('style', '<i2'),
+        ('material', '<f4', (MATERIAL_PARAMS,)),
+        ('lights', '<f4', (lights, LIGHT_PARAMS)),
+        ('instances', '<f4', (instances, INSTANCE_PARAMS)),
+        # Viewpoints of the same rig see the same scene, they are rendered together.
+        ('rig', '<i4'),
+    ])
+
+
+def sample_lights(lights: List[Light],
+                  amount: int,
+                  rng: np.random.RandomState,
+                  max_ranges: np.ndarray,
+                  max_energies: np.ndarray) -> np.ndarray:
+    """
+    Sample the params of every light for an amount of viewpoints, following
+    the kinds semantics of DataGenApplyFuncts.create_light.
+    :param lights: the Lights of the config.
+    :param amount: amount of viewpoints.
+    :param rng: numpy random generator.
+    :param max_ranges: (amount, len(lights)) light max_range of each viewpoint.
+    :param max_energies: (amount, len(lights)) light max_energy of each viewpoint.
+    :return: array (amount, len(lights), LIGHT_PARAMS)
+    """
+    params = np.full((amount, len(lights), LIGHT_PARAMS), np.nan, dtype=np.float32)
+
+    for i, li in enumerate(lights):
+        max_range = max_ranges[:, i, None]
+        max_energy = max_energies[:, i]
+
+        if li.kind == Light.Kind.STATIC_LIGHT:
+            params[:, i, 0:3] = li.color
+            params[:, i, 3:6] = li.location
+            params[:, i, 6] = max_energy
+
+        elif li.kind == Light.Kind.DYNAMIC_LIGHT:
+            params[:, i, 0:3] = li.color
+            params[:, i, 3:6] = rng.uniform(-max_range, max_range, (amount, 3))
+            params[:, i, 6] = rng.uniform(0, max_energy, amount)
+
+        elif li.kind == Light.Kind.RAINBOW_STATIC_LIGHT:
+            params[:, i, 0:3] = rng.uniform(0, 1, (amount, 3))
+            params[:, i, 3:6] = li.location
+            params[:, i, 6] = max_energy
+
+        elif li.kind == Light.Kind.RAINBOW_DYNAMIC_LIGHT:
+            params[:, i, 0:3] = rng.uniform(0, 1, (amount, 3))
+            params[:, i, 3:6] = rng.uniform(-max_range, max_range, (amount, 3))
+            params[:, i, 6] = rng.uniform(0, max_energy, amount)
+
+    return params
+
+
+def sample_materials(materials: np.ndarray, rng: np.random.RandomState) -> np.ndarray:
+    """
+    Replace the NaN material params by random values, all the variants of a
+    batch at once.
+    :param materials: (amount, MATERIAL_PARAMS) params, NaN where not set.
+    :param rng: numpy random generator.
+    """
+    low, high = MATERIAL_RANGES[:, 0], MATERIAL_RANGES[:, 1]
+    samples = rng.uniform(low, high, materials.shape).astype(np.float32)
+    return np.where(np.isnan(materials), samples, materials)
+
+
+def sample_instances(instances: int,
+                     amount: int,
+                     rng: np.random.RandomState,
+                     dimension: float,
+                     scale: float) -> np.ndarray:
+    """
+    Sample the poses of the clutter instances for an amount of viewpoints.
+    Instances are placed inside a cube twice the environment size, around the
+    object, with a random rotation and a scale between scale / 2 and scale.
+    :param instances: amount of instances.
+    :param amount: amount of viewpoints.
+    :param rng: numpy random generator.
+    :param dimension: environment dimension.
+    :param scale: max scale of an instance.
+    :return: array (amount, instances, INSTANCE_PARAMS)
+    """
+    params = np.empty((amount, instances, INSTANCE_PARAMS), dtype=np.float32)
+    params[..., 0:3] = rng.uniform(-dimension, dimension, (amount, instances, 3))
+    params[..., 3:6] = rng.uniform(0, 2 * np.pi, (amount, instances, 3))
+    params[..., 6] = rng.uniform(scale / 2, scale, (amount, instances))
+    return params
+
+
+def rig_poses(center: tuple, v: Viewpoint) -> np.ndarray:
+    """
+    Poses of the cameras of a rig, all of them aim at the origin. A stereo
+    rig has a left and a right camera baseline apart, perpendicular to the
+    view direction; a ring has its cameras evenly spaced on the horizontal
+    circle through the center.
+    :param center: pose of the rig.
+    :param v: CAMERA_RIG viewpoint.
+    :return: array (rig size, 3)
+    """
+    center = np.asarray(center, dtype=np.float64)
+    if v.rig == Viewpoint.Rig.STEREO:
+        right = np.cross(-center, (0, 0, 1))
+        norm = np.linalg.norm(right)
+        right = right / norm if norm > 1e-9 else np.array([1.0, 0.0, 0.0])  # camera over the object.
+        return center + np.outer((-0.5, 0.5), right) * v.baseline
+
+    radius = np.hypot(center[0], center[1])
+    angles = np.arctan2(center[1], center[0]) + 2 * np.pi * np.arange(v.rig_cameras) / v.rig_cameras
+    return np.stack([radius * np.cos(angles), radius * np.sin(angles), np.full(len(angles), center[2])], axis=1)
+
+
+def sweep_fields(obj: Object, lights: List[Light]) -> Dict:
+    """
+    The sweep fields of an object material and of the lights.
+    """
+    fields = {name: getattr(obj.material, name) for name in Sweep.MATERIAL_FIELDS}
+    for i, li in enumerate(lights):
+        fields.update({(i, name): getattr(li, name) for name in Sweep.LIGHT_FIELDS})
+    return fields
+
+
+class JobPlan:
+    """
+    A Config expanded into a flat table of render jobs. The table can be
+    counted, sorted, shuffled or split before rendering, and saved to disk.
+    """
+    def __init__(self,
+                 objects: List[Dict],
+                 textures: List[str],
+                 styles: List[str],
+                 table: np.ndarray):
+        self.objects = objects
+        self.textures = textures
+        self.styles = styles
+        self.table = table
+
+    def __len__(self):
+        return len(self.table)
+
+    def save(self, path: str):
+        """
+        Save the plan into a numpy .npz archive.
+        :param path: output path.
+        """
+        meta = json.dumps({'objects': self.objects, 'textures': self.textures, 'styles': self.styles})
+        with open(path, "wb") as fw:
+            np.savez(fw, table=self.table, meta=np.array(meta))
+
+    @staticmethod
+    def load(path: str) -> 'JobPlan':
+        """
+        Load a plan saved with JobPlan.save
+        :param path: plan path.
+        """
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            return JobPlan(table=data['table'], **meta)
+
+    def subset(self, rows) -> 'JobPlan':
+        """
+        A plan with some rows of the table, for example a shard or a shuffle.
+        :param rows: index, mask or slice of the table.
+        """
+        return JobPlan(self.objects, self.textures, self.styles, self.table[rows])
+
+    def object_jobs(self) -> Iterator[Tuple[Object, Iterator[np.ndarray]]]:
+        """
+        Group the jobs by object, sorted by viewpoint inside each object.
+        :return: iterator of (Object, batches of jobs of the object)
+        """
+        table = self.table[np.lexsort((self.table['viewpoint'], self.table['object']))]
+        bounds = np.flatnonzero(np.diff(table['object'])) + 1
+        for jobs in np.split(table, bounds):
+            if len(jobs):
+                yield reconstruct(dict(self.objects[jobs['object'][0]])), iter([jobs])
+
+
+class JobPlanner:
+    """
+    Expands a Config into job tables. Viewpoints and textures are taken from
+    the functs, so random viewpoints are sampled the same way as before; light
+    params are sampled here so every job is fully described by its row.
+    Poses are consumed from the viewpoints iterators in batches, so rendering
+    starts at once and memory does not depend on the amount of poses.
+    """
+    BATCH_SIZE = 1024
+    # Next to the renders, the seed that sampled them.
+    SEED_FILE = "seed.json"
+
+    def __init__(self,
+                 config: Config,
+                 functs: DataGenFunctsInterface,
+                 preview: bool,
+                 seed: Optional[int] = None,
+                 batch_size: int = BATCH_SIZE):
+        self.config = config
+        self.functs = functs
+        self.preview = preview
+        self.batch_size = batch_size
+        # The seed is always known, so the light tables can be sampled again.
+        self.reseed(seed if seed is not None else int(np.random.randint(2 ** 31)))
+        self.textures = []
+        self.styles = list(config.render.styles)
+        self.dtype = job_dtype(len(config.lights), config.environment.clutter)
+
+    def reseed(self, seed: int):
+        """
+        Sample the jobs from the start of a seed stream.
+        """
+        self.seed = seed
+        self.rng = np.random.RandomState(seed)
+        print(f"Sampling the jobs with seed {seed}")
+
+    def save_seed(self):
+        """
+        Save the seed with the renders, so the jobs of a dataset can be
+        expanded again to repair it.
+        """
+        output_dir = self.config.render.output_dir_path
+        os.makedirs(output_dir, exist_ok=True)
+        with open(os.path.join(output_dir, JobPlanner.SEED_FILE), "w") as fw:
+            json.dump({'seed': self.seed}, fw)
+
+    @staticmethod
+    def load_seed(output_dir: str) -> Optional[int]:
+        """
+        The seed saved with the renders of a folder, None if it is unknown.
+        :param output_dir: render output folder.
+        """
+        path = os.path.join(output_dir, JobPlanner.SEED_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as fr:
+            return json.load(fr)['seed']
+
+    def texture_id(self, texture: str) -> int:
+        if texture not in self.textures:
+            self.textures.append(texture)
+        return self.textures.index(texture)
+
+    def expand(self, object_id: int, obj: Object) -> Iterator[np.ndarray]:
+        """
+        Build the jobs of an object: every viewpoint in every style.
+        :param object_id: object index in the plan.
+        :param obj: the object.
+        :return: iterator of batches of jobs, up to batch_size viewpoints each.
+        """
+        viewpoints = self.functs.create_viewpoints(self.config.viewpoints, self.preview, rng=self.rng)
+        # A rig is never split between batches, its viewpoints share the samples.
+        rigs_stream = itertools.groupby(self.rig_poses(viewpoints), key=lambda pose_rig: pose_rig[1])
+        # Each rig takes the next combination of the material and light sweeps.
+        samples_stream = Sweep.stream(sweep_fields(obj, self.config.lights))
+        first = 0
+
+        while True:
+            batch = []
+            for _, rig in rigs_stream:
+                batch.extend(rig)
+                if len(batch) >= self.batch_size:
+                    break
+            if not batch:
+                return
+
+            poses = np.array([pose for pose, _ in batch], dtype=np.float64).reshape(-1, 3)
+            rigs = np.array([rig for _, rig in batch], dtype=np.int32)
+            _, inverse = np.unique(rigs, return_inverse=True)
+            samples = list(itertools.islice(samples_stream, inverse.max() + 1))
+            yield self.jobs(object_id, obj, first, poses, [samples[i] for i in inverse], rigs)
+            first += len(poses)
+
+    def rig_poses(self, viewpoints: List[Iterable]) -> Iterator[Tuple[tuple, int]]:
+        """
+        The poses of the viewpoints with their rig id. A pose of a CAMERA_RIG
+        viewpoint is expanded into its cameras, any other pose is a rig alone.
+        :param viewpoints: the poses iterators made by the functs.
+        :return: iterator of (pose, rig)
+        """
+        rig = 0
+        for v, poses in zip(self.config.viewpoints, viewpoints):
+            for pose in poses:
+                if v.kind == Viewpoint.Kind.CAMERA_RIG and not self.preview:
+                    for camera in rig_poses(pose, v):
+                        yield tuple(camera.tolist()), rig
+                else:
+                    yield pose, rig
+                rig += 1
+
+    def jobs(self, object_id: int, obj: Object, first: int, poses: np.ndarray, samples: List[Dict],
+             rigs: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Build the jobs of a batch of poses.
+        :param object_id: object index in the plan.
+        :param obj: the object.
+        :param first: viewpoint index of the first pose.
+        :param poses: (n, 3) poses.
+        :param samples: the sweeps sample of each pose.
+        :param rigs: (n,) rig of each pose, by default each pose is a rig alone.
+        """
+        if rigs is None:
+            rigs = np.arange(first, first + len(poses), dtype=np.int32)
+        # The cameras of a rig take the texture, material, lights and clutter of its first one.
+        _, leads, inverse = np.unique(rigs, return_index=True, return_inverse=True)
+        lead = leads[inverse]
+
+        textures = [self.texture_id(self.functs.define_texture(obj, rng=self.rng)) for _ in range(len(poses))]
+        textures = np.array(textures)[lead]
+
+        materials = np.array([
+            [np.nan if sample[name] is None else sample[name] for name in Sweep.MATERIAL_FIELDS]
+            for sample in samples
+        ], dtype=np.float32).reshape(-1, MATERIAL_PARAMS)
+        if obj.material.kind in (Material.Kind.STATIC_TEXTURE_DYNAMIC_PARAMS, Material.Kind.DYNAMIC_TEXTURE_AND_PARAMS):
+            materials = sample_materials(materials, self.rng)
+
+        def light_values(name: str) -> np.ndarray:
+            return np.array([
+                [sample[(i, name)] for i, _ in enumerate(self.config.lights)] for sample in samples
+            ], dtype=np.float64).reshape(len(poses), len(self.config.lights))
+
+        lights = sample_lights(self.config.lights, len(poses), self.rng,
+                               max_ranges=light_values('max_range'), max_energies=light_values('max_energy'))
+        e = self.config.environment
+        instances = sample_instances(e.clutter, len(poses), self.rng, e.dimension, e.clutter_scale)
+        hdris = self.rng.randint(len(e.hdris), size=len(poses)) if e.hdris else np.full(len(poses), -1)
+        styles = len(self.styles)
+
+        jobs = np.zeros(len(poses) * styles, dtype=self.dtype)
+        jobs['object'] = object_id
+        jobs['viewpoint'] = np.repeat(np.arange(first, first + len(poses)), styles)
+        jobs['pose'] = np.repeat(poses, styles, axis=0)
+        jobs['texture'] = np.repeat(textures, styles)
+        jobs['hdri'] = np.repeat(hdris[lead], styles)
+        jobs['style'] = np.tile(np.arange(styles), len(poses))
+        jobs['material'] = np.repeat(materials[lead], styles, axis=0)
+        jobs['lights'] = np.repeat(lights[lead], styles, axis=0)
+        jobs['instances'] = np.repeat(instances[lead], styles, axis=0)
+        jobs['rig'] = np.repeat(rigs, styles)
+
+        return jobs
+
+    def scenes(self) -> Iterator[Object]:
+        """
+        The objects to render. In clutter scenes with several models, each
+        object takes the next ones of the config as companions.
+        """
+        e = self.config.environment
+        if not e.clutter or e.clutter_models <= 1:
+            yield from self.config.objects
+            return
+
+        objects = iter(self.config.objects)
+        while True:
+            group = list(itertools.islice(objects, e.clutter_models))
+            if not group:
+                return
+            scene = copy.copy(group[0])
+            scene.companions = [obj.path for obj in group[1:]]
+            yield scene
+
+    def object_jobs(self) -> Iterator[Tuple[Object, Iterator[np.ndarray]]]:
+        """
+        Lazily expand the config object by object.
+        :return: iterator of (Object, batches of jobs of the object)
+        """
+        for object_id, obj in enumerate(self.scenes()):
+            yield obj, self.expand(object_id, obj)
+
+    def plan(self) -> JobPlan:
+        """
+        Expand the whole config.
+        """
+        objects, tables = [], []
+        for obj, batches in self.object_jobs():
+            objects.append(snapshot(obj))
+            tables.extend(batches)
+
+        table = np.concatenate(tables) if tables else np.zeros(0, dtype=self.dtype)
+        return JobPlan(objects, self.textures, self.styles, table)
@@ -0,0 +1,92 @@
+import cProfile
+import os
+import tracemalloc
+
+from contextlib import contextmanager
+from typing import Optional
+
+
+class Profiler:
+    """
+    Profiling of a generator run. Each object gets a cProfile dump,
+    <name>.pstats, readable with pstats or snakeviz. With every > 1 only every
+    Nth viewpoint is profiled, so production runs keep a low overhead. With
+    memory, a tracemalloc snapshot is taken between objects and the biggest
+    growths since the previous object are printed.
+    """
+    TOP_LINES = 5
+
+    def __init__(self, path: str, every: int = 1, memory: bool = False):
+        """
+        :param path: folder of the dumps.
+        :param every: profile every Nth viewpoint, 1 profiles the whole objects.
+        :param memory: take tracemalloc snapshots.
+        """
+        assert every > 0, "every must be positive!"
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.every = every
+        self.memory = memory
+        self.profile: Optional[cProfile.Profile] = None
+        self.sampled = False
+        self.previous: Optional[tracemalloc.Snapshot] = None
+        # Tracing started by someone else is left running on close.
+        self.started = memory and not tracemalloc.is_tracing()
+        if self.started:
+            tracemalloc.start()
+
+    @contextmanager
+    def object(self, name: str):
+        """
+        Profile the rendering of an object.
+        :param name: object name.
+        """
+        self.profile = cProfile.Profile()
+        self.sampled = self.every == 1
+        if self.sampled:
+            self.profile.enable()
+        try:
+            yield
+        finally:
+            self.profile.disable()
+            if self.sampled:
+                self.profile.dump_stats(os.path.join(self.path, f"{name}.pstats"))
+            self.profile = None
+
+    @contextmanager
+    def viewpoint(self, index: int):
+        """
+        Profile a viewpoint of the current object, if it is sampled.
+        :param index: viewpoint index.
+        """
+        if self.profile is None or self.every == 1 or index % self.every:
+            yield
+            return
+
+        self.sampled = True
+        self.profile.enable()
+        try:
+            yield
+        finally:
+            self.profile.disable()
+
+    def snapshot(self, name: str):
+        """
+        Take a memory snapshot after an object was cleared.
+        :param name: object name.
+        """
+        if not self.memory:
+            return
+
+        snapshot = tracemalloc.take_snapshot()
+        snapshot.dump(os.path.join(self.path, f"{name}.tracemalloc"))
+        if self.previous is not None:
+            print(f"Python memory growth after {name}:")
+            for stat in snapshot.compare_to(self.previous, 'lineno')[:Profiler.TOP_LINES]:
+                print(f"  {stat}")
+        self.previous = snapshot
+
+    def close(self):
+        if self.started:
+            tracemalloc.stop()
+            self.started = False
@@ -0,0 +1,86 @@
+import os
+
+from typing import List
+
+import numpy as np
+
+from .basics import Render
+from .tensors import PngReader, PngWriter
+
+
+class Resampler:
+    """
+    Smaller copies of the rendered images, so a single render gives every
+    output resolution. Label styles are resampled by nearest neighbor, so
+    their values stay exact; the rest by area average.
+    """
+    MASK_STYLES = (Render.Style.SILHOUETTE, Render.Style.TEXTURE_SEGMENTATION, Render.Style.INSTANCE_SEGMENTATION)
+
+    @staticmethod
+    def area_weights(size: int, new_size: int) -> np.ndarray:
+        """
+        Fraction of each input pixel covered by each output pixel.
+        :return: (new_size, size) weights, each row sums 1.
+        """
+        edges = np.arange(new_size + 1) * size / new_size
+        pixels = np.arange(size)
+        overlap = np.minimum(edges[1:, None], pixels + 1) - np.maximum(edges[:-1, None], pixels)
+        return np.clip(overlap, 0, None) * new_size / size
+
+    @staticmethod
+    def area(image: np.ndarray, width: int, height: int) -> np.ndarray:
+        """
+        Area average resampling. Colors are weighted by the alpha, so the
+        transparent background does not darken the borders.
+        :param image: uint8 array (height, width, channels)
+        """
+        pixels = image.astype(np.float32)
+        alpha = image.shape[2] in (2, 4)
+        if alpha:
+            pixels[:, :, :-1] *= pixels[:, :, -1:] / 255
+
+        rows = np.tensordot(Resampler.area_weights(image.shape[0], height).astype(np.float32), pixels, axes=(1, 0))
+        out = np.tensordot(Resampler.area_weights(image.shape[1], width).astype(np.float32), rows, axes=(1, 1))
+        out = out.transpose(1, 0, 2)
+
+        if alpha:
+            coverage = out[:, :, -1:]
+            out[:, :, :-1] = np.where(coverage > 0, out[:, :, :-1] * 255 / np.maximum(coverage, 1e-6), 0)
+        return np.clip(np.rint(out), 0, 255).astype(np.uint8)
+
+    @staticmethod
+    def nearest(image: np.ndarray, width: int, height: int) -> np.ndarray:
+        """
+        Nearest neighbor resampling, the pixel at the center of each output pixel.
+        :param image: array (height, width, channels)
+        """
+        rows = ((np.arange(height) + 0.5) * image.shape[0] / height).astype(np.int64)
+        columns = ((np.arange(width) + 0.5) * image.shape[1] / width).astype(np.int64)
+        return image[rows][:, columns]
+
+    @staticmethod
+    def path(output: str, width: int, height: int) -> str:
+        """
+        Path of a copy: <style>_<width>x<height>.PNG next to the rendered image.
+        """
+        root, extension = os.path.splitext(output)
+        return f"{root}_{width}x{height}{extension}"
+
+    @staticmethod
+    def write_resolutions(output: str, style: str, resolutions: List[List[int]]) -> List[str]:
+        """
+        Write the copies of a rendered image.
+        :param output: rendered image.
+        :param style: render style.
+        :param resolutions: list of [width, height]
+        :return: the copies paths.
+        """
+        image = PngReader.read(output)
+        resize = Resampler.nearest if style in Resampler.MASK_STYLES else Resampler.area
+
+        paths = []
+        for width, height in resolutions:
+            path = Resampler.path(output, width, height)
+            PngWriter.write(path, resize(image, width, height))
+            paths.append(path)
+        return paths
@@ -0,0 +1,134 @@
+import json
+import os
+import sqlite3
+
+from typing import List, Optional, Sequence, Tuple
+
+from .sweep import Sweep
+
+
+class SampleIndex:
+    """
+    SQLite index of the samples of a dataset, kept by the generator as the
+    viewpoints are rendered, so subsets are selected with a query instead of
+    walking the folders and parsing the csv of every object. A sample is a
+    viewpoint of an object, its images are in the files table by style.
+    """
+    FILE = "samples.sqlite"
+    TIMEOUT = 60
+    EXTENSION = "PNG"
+
+    SCHEMA = f"""
+        CREATE TABLE IF NOT EXISTS samples (
+            id INTEGER PRIMARY KEY,
+            object TEXT NOT NULL,
+            idx INTEGER NOT NULL,
+            view_x REAL NOT NULL,
+            view_y REAL NOT NULL,
+            view_z REAL NOT NULL,
+            texture TEXT,
+            hdri TEXT,
+            {", ".join(f"{field} REAL" for field in Sweep.MATERIAL_FIELDS)},
+            lights TEXT NOT NULL,
+            UNIQUE (object, idx)
+        );
+        CREATE TABLE IF NOT EXISTS files (
+            sample INTEGER NOT NULL REFERENCES samples (id),
+            style TEXT NOT NULL,
+            path TEXT NOT NULL,
+            PRIMARY KEY (sample, style)
+        );
+        CREATE INDEX IF NOT EXISTS samples_texture ON samples (texture);
+        CREATE INDEX IF NOT EXISTS samples_view_z ON samples (view_z);
+        CREATE INDEX IF NOT EXISTS files_style ON files (style);
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: index file, several processes can write to it.
+        """
+        self.path = path
+        # Autocommit mode, transactions are opened explicitly. The generator
+        # thread is not always the one that created it.
+        self.connection = sqlite3.connect(path, timeout=SampleIndex.TIMEOUT, isolation_level=None,
+                                          check_same_thread=False)
+        self.connection.executescript(SampleIndex.SCHEMA)
+        # Indices made before the HDRI was recorded.
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(samples)")]
+        if "hdri" not in columns:
+            self.connection.execute("ALTER TABLE samples ADD COLUMN hdri TEXT")
+
+    @staticmethod
+    def open(output_dir: str) -> 'SampleIndex':
+        return SampleIndex(os.path.join(output_dir, SampleIndex.FILE))
+
+    def close(self):
+        self.connection.close()
+
+    def add(self, obj: str, rows: List[list], styles: List[str]):
+        """
+        Index rendered viewpoints. A viewpoint rendered again keeps its id and
+        gets its values updated, only the files of the given styles are
+        replaced, those of other styles stay.
+        :param obj: object name.
+        :param rows: the object csv rows: index, pose, texture, hdri, material and lights values.
+        :param styles: the styles rendered for each viewpoint.
+        """
+        materials = len(Sweep.MATERIAL_FIELDS)
+        columns = ("object", "idx", "view_x", "view_y", "view_z", "texture", "hdri", *Sweep.MATERIAL_FIELDS, "lights")
+
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            for row in rows:
+                index, pose, texture, hdri = row[0], row[1:4], row[4], row[5] or None
+                material, lights = row[6:6 + materials], row[6 + materials:]
+                # NaN is not valid JSON, unset values are stored as NULL.
+                material = [None if value != value else value for value in material]
+                lights = [None if value != value else value for value in lights]
+
+                values = (obj, index, *pose, texture, hdri, *material, json.dumps(lights))
+                existing = self.connection.execute(
+                    "SELECT id FROM samples WHERE object = ? AND idx = ?", (obj, index)
+                ).fetchone()
+                if existing is None:
+                    sample_id = self.connection.execute(
+                        f"INSERT INTO samples ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                        values
+                    ).lastrowid
+                else:
+                    sample_id = existing[0]
+                    self.connection.execute(
+                        f"UPDATE samples SET {', '.join(f'{column} = ?' for column in columns)} WHERE id = ?",
+                        (*values, sample_id)
+                    )
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO files (sample, style, path) VALUES (?, ?, ?)",
+                    [(sample_id, style, os.path.join(obj, str(index), f"{style}.{SampleIndex.EXTENSION}"))
+                     for style in styles]
+                )
+            self.connection.execute("COMMIT")
+        except Exception:
+            self.connection.execute("ROLLBACK")
+            raise
+
+    def select(self, style: str, where: str = "", params: Sequence = ()) -> List[Tuple[str, int, str]]:
+        """
+        Select the images of a style, e.g.
+        select("ray-traced", "texture = ? AND view_z > 0", ("GOLD",))
+        :param style: render style.
+        :param where: SQL condition over the samples columns.
+        :param params: the condition parameters.
+        :return: list of (object, index, image path relative to the output folder)
+        """
+        condition = f"AND ({where})" if where else ""
+        return self.connection.execute(
+            "SELECT samples.object, samples.idx, files.path FROM samples "
+            "JOIN files ON files.sample = samples.id "
+            f"WHERE files.style = ? {condition} ORDER BY samples.object, samples.idx",
+            (style, *params)
+        ).fetchall()
+
+    def count(self, style: Optional[str] = None) -> int:
+        if style is None:
+            return self.connection.execute("SELECT COUNT(*) FROM samples").fetchone()[0]
+        return self.connection.execute("SELECT COUNT(*) FROM files WHERE style = ?", (style,)).fetchone()[0]
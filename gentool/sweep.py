@@ -0,0 +1,94 @@
+import copy
+import itertools
+
+from typing import Dict, Iterable, Iterator
+
+
+class Sweep:
+    """
+    Config fields that accept a sweep instead of a single value:
+    - a value: 0.5
+    - a list of values: [0.1, 0.5, 0.9]
+    - a range with the amount of values: {"start": 0, "stop": 1, "num": 5}
+    - a range with a step: {"start": 10, "stop": 100, "step": 30}
+    Ranges are inclusive and every sweep is generated lazily.
+    """
+    START = "start"
+    STOP = "stop"
+    STEP = "step"
+    NUM = "num"
+
+    MATERIAL_FIELDS = ('metallic', 'specular', 'roughness', 'hue', 'scale')
+    LIGHT_FIELDS = ('max_energy', 'max_range')
+
+    @staticmethod
+    def is_sweep(value) -> bool:
+        return isinstance(value, (list, tuple, dict))
+
+    @staticmethod
+    def _range(spec: Dict) -> Iterator[float]:
+        start, stop = spec[Sweep.START], spec[Sweep.STOP]
+        if Sweep.NUM in spec:
+            num = int(spec[Sweep.NUM])
+            for i in range(num):
+                yield start if num == 1 else start + (stop - start) * i / (num - 1)
+            return
+
+        step = spec[Sweep.STEP]
+        assert step > 0, "sweep step must be positive"
+        i = 0
+        while start + step * i <= stop + step * 1e-9:
+            yield start + step * i
+            i += 1
+
+    @staticmethod
+    def values(value) -> Iterable:
+        """
+        The values of a field.
+        :param value: a value, a list or a range.
+        """
+        if isinstance(value, dict):
+            return Sweep._range(value)
+        if isinstance(value, (list, tuple)):
+            return value
+        return (value,)
+
+    @staticmethod
+    def combinations(fields: Dict) -> Iterator[Dict]:
+        """
+        Lazy cartesian product of the fields values.
+        :param fields: field name -> value, list or range.
+        :return: iterator of field name -> value.
+        """
+        names = list(fields)
+        for values in itertools.product(*(Sweep.values(fields[name]) for name in names)):
+            yield dict(zip(names, values))
+
+    @staticmethod
+    def stream(fields: Dict) -> Iterator[Dict]:
+        """
+        Endless iterator over the combinations, it starts again when all of them
+        were used, without keeping them in memory.
+        :param fields: field name -> value, list or range.
+        """
+        while True:
+            empty = True
+            for combination in Sweep.combinations(fields):
+                empty = False
+                yield combination
+            # An empty list or range would loop forever.
+            assert not empty, f"A sweep has no values: {fields}"
+
+    @staticmethod
+    def pin(instance, fields: Iterable[str]):
+        """
+        Copy of a Material or Light with the first value of each sweep.
+        :param instance: the Material or Light.
+        :param fields: the sweep fields of the instance.
+        """
+        pinned = copy.copy(instance)
+        for name in fields:
+            value = getattr(instance, name)
+            if Sweep.is_sweep(value):
+                setattr(pinned, name, next(iter(Sweep.values(value))))
+        return pinned
@@ -0,0 +1,286 @@
+import csv
+import json
+import os
+import struct
+import zlib
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+class ImageFormatError(Exception):
+    """
+    The PNG uses a feature the numpy reader does not handle (palette,
+    interlacing).
+    """
+    pass
+
+
+class PngReader:
+    SIGNATURE = b"\x89PNG\r\n\x1a\n"
+    # Last chunk of every PNG: empty, so always the same bytes.
+    IEND = struct.pack(">I4sI", 0, b"IEND", zlib.crc32(b"IEND"))
+
+    # Channels of each PNG color type: gray, RGB, gray + alpha, RGBA.
+    CHANNELS = {0: 1, 2: 3, 4: 2, 6: 4}
+
+    NONE, SUB, UP, AVERAGE, PAETH = range(5)
+
+    @staticmethod
+    def _chunks(data: bytes) -> Iterable[Tuple[bytes, bytes]]:
+        offset = len(PngReader.SIGNATURE)
+        while offset < len(data):
+            length, kind = struct.unpack(">I4s", data[offset:offset + 8])
+            yield kind, data[offset + 8:offset + 8 + length]
+            offset += length + 12  # length, type and crc
+
+    @staticmethod
+    def _unfilter(raw: np.ndarray, bpp: int) -> np.ndarray:
+        """
+        Undo the PNG filters. Images without filters are taken as they are,
+        images with only Sub and Up filters are undone row by row with
+        whole row operations.
+        :param raw: (height, 1 + row bytes) decompressed data.
+        :param bpp: bytes per pixel.
+        """
+        filters = raw[:, 0]
+        rows = raw[:, 1:]
+        if not filters.any():
+            return rows
+        if (filters >= PngReader.AVERAGE).any():
+            return PngReader._unfilter_wavefront(filters, rows, bpp)
+
+        out = np.zeros_like(rows)
+        previous = np.zeros(rows.shape[1], dtype=np.uint8)
+        for y, kind in enumerate(filters):
+            row = rows[y]
+            if kind == PngReader.NONE:
+                out[y] = row
+            elif kind == PngReader.SUB:
+                # Sums wrap around at 256, as the filter does.
+                out[y] = np.cumsum(row.reshape(-1, bpp), axis=0, dtype=np.uint8).ravel()
+            else:
+                out[y] = row + previous
+            previous = out[y]
+        return out
+
+    @staticmethod
+    def _unfilter_wavefront(filters: np.ndarray, rows: np.ndarray, bpp: int) -> np.ndarray:
+        """
+        Undo any mix of filters. A pixel depends on its left, upper and upper
+        left neighbors, so the pixels of an anti-diagonal (x + y constant)
+        are independent and are undone together: width + height steps
+        instead of a step per pixel. libpng, used by Blender, picks a filter
+        for each row and Paeth is frequent in the renders.
+        :param filters: (height,) filter of each row.
+        :param rows: (height, row bytes) filtered data.
+        :param bpp: bytes per pixel.
+        """
+        height, width = rows.shape[0], rows.shape[1] // bpp
+        filtered = rows.reshape(height, width, bpp).astype(np.int16)
+        # A row and a column of zeros before the image, the neighbors out of it.
+        out = np.zeros((height + 1, width + 1, bpp), dtype=np.int16)
+        kinds = filters.astype(np.int16)[:, None]
+
+        for diagonal in range(height + width - 1):
+            y = np.arange(max(0, diagonal - width + 1), min(height, diagonal + 1))
+            x = diagonal - y
+            left, up, upper_left = out[y + 1, x], out[y, x + 1], out[y, x]
+            kind = kinds[y]
+
+            p = left + up - upper_left
+            pa, pb, pc = np.abs(p - left), np.abs(p - up), np.abs(p - upper_left)
+            paeth = np.where((pa <= pb) & (pa <= pc), left, np.where(pb <= pc, up, upper_left))
+            predictor = np.select(
+                [kind == PngReader.SUB, kind == PngReader.UP, kind == PngReader.AVERAGE, kind == PngReader.PAETH],
+                [left, up, (left + up) // 2, paeth]
+            )
+            out[y + 1, x + 1] = (filtered[y, x] + predictor) & 0xFF
+
+        return out[1:, 1:].astype(np.uint8).reshape(height, -1)
+
+    @staticmethod
+    def read(path: str) -> np.ndarray:
+        """
+        Read a non interlaced 8 or 16 bits PNG into a uint8 array.
+        :param path: image path.
+        :return: array (height, width, channels)
+        """
+        with open(path, "rb") as fr:
+            data = fr.read()
+        if not data.startswith(PngReader.SIGNATURE):
+            raise ImageFormatError(f"{path} is not a PNG file")
+
+        header, idat = None, []
+        for kind, chunk in PngReader._chunks(data):
+            if kind == b"IHDR":
+                header = struct.unpack(">IIBBBBB", chunk)
+            elif kind == b"IDAT":
+                idat.append(chunk)
+            elif kind == b"IEND":
+                break
+
+        width, height, depth, color, _, _, interlace = header
+        if color not in PngReader.CHANNELS or depth not in (8, 16) or interlace:
+            raise ImageFormatError(f"{path}: color type {color}, depth {depth} or interlacing not supported")
+
+        channels = PngReader.CHANNELS[color]
+        bpp = channels * depth // 8
+        raw = np.frombuffer(zlib.decompress(b"".join(idat)), dtype=np.uint8).reshape(height, 1 + width * bpp)
+        pixels = PngReader._unfilter(raw, bpp)
+
+        if depth == 16:  # keep the most significant byte.
+            pixels = pixels.reshape(height, -1, 2)[:, :, 0]
+        return pixels.reshape(height, width, channels)
+
+
+class PngWriter:
+    # PNG color type of each amount of channels.
+    COLOR_TYPES = {channels: color for color, channels in PngReader.CHANNELS.items()}
+    COMPRESSION = 6
+
+    @staticmethod
+    def _chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    @staticmethod
+    def write(path: str, image: np.ndarray, compression: int = COMPRESSION):
+        """
+        Write a uint8 array as an 8 bits PNG, without filters.
+        :param path: image path.
+        :param image: array (height, width, channels)
+        :param compression: zlib level.
+        """
+        height, width, channels = image.shape
+        raw = np.zeros((height, 1 + width * channels), dtype=np.uint8)  # filter 0 on each row.
+        raw[:, 1:] = image.reshape(height, -1)
+        header = struct.pack(">IIBBBBB", width, height, 8, PngWriter.COLOR_TYPES[channels], 0, 0, 0)
+
+        with open(path, "wb") as fw:
+            fw.write(PngReader.SIGNATURE)
+            fw.write(PngWriter._chunk(b"IHDR", header))
+            fw.write(PngWriter._chunk(b"IDAT", zlib.compress(raw.tobytes(), compression)))
+            fw.write(PngReader.IEND)
+
+
+def to_channels(image: np.ndarray, channels: int) -> np.ndarray:
+    """
+    Convert an image between gray, gray + alpha, RGB and RGBA.
+    """
+    if image.shape[2] == channels:
+        return image
+    color = image[:, :, :1 if image.shape[2] < 3 else 3]
+    alpha = image[:, :, -1:] if image.shape[2] in (2, 4) else np.full(image.shape[:2] + (1,), 255, np.uint8)
+    if channels in (3, 4) and color.shape[2] == 1:
+        color = np.repeat(color, 3, axis=2)
+    if channels in (1, 2) and color.shape[2] == 3:
+        color = color.mean(axis=2, keepdims=True).astype(np.uint8)
+    return np.concatenate((color, alpha), axis=2) if channels in (2, 4) else color
+
+
+class TensorStore:
+    """
+    A style of a dataset packed as a fixed-shape uint8 .npy, which data
+    loaders open with np.load(mmap_mode='r') and slice without copies, plus
+    an index array with the (object, viewpoint index) of each row.
+    """
+    OBJECTS = "objects.json"
+
+    def __init__(self, path: str, style: str, rows: np.ndarray, shape: Tuple[int, int, int]):
+        """
+        :param path: output folder.
+        :param style: render style.
+        :param rows: (n, 2) object id and viewpoint index of each row.
+        :param shape: (height, width, channels) of the images.
+        """
+        self.style = style
+        self.images = np.lib.format.open_memmap(
+            os.path.join(path, f"{style}.npy"), mode="w+", dtype=np.uint8, shape=(len(rows), *shape)
+        )
+        np.save(os.path.join(path, f"{style}_index.npy"), rows.astype(np.int32))
+
+    def write(self, row: int, image: np.ndarray):
+        """
+        Write an image, from a file or straight from a render.
+        """
+        assert image.shape[:2] == self.images.shape[1:3], \
+            f"{self.style} image {row} is {image.shape}, expected {self.images.shape[1:]}"
+        self.images[row] = to_channels(image, self.images.shape[3])
+
+    def close(self):
+        self.images.flush()
+        del self.images
+
+
+class TensorExport:
+    WORKERS = os.cpu_count() or 1
+
+    @staticmethod
+    def rows(output_dir: str) -> Tuple[List[str], np.ndarray]:
+        """
+        The rendered viewpoints of a dataset, from the objects csv.
+        :param output_dir: render output folder.
+        :return: the objects names and (n, 2) object id and viewpoint index.
+        """
+        names, rows = [], []
+        for name in sorted(os.listdir(output_dir)):
+            csv_path = os.path.join(output_dir, name, f"{name}.csv")
+            if not os.path.isfile(csv_path):
+                continue
+            with open(csv_path, "r", newline="") as f:
+                # Rows could be repeated when a job queue rendered a viewpoint twice.
+                indices = sorted({int(row['index']) for row in csv.DictReader(f)})
+            rows.extend((len(names), i) for i in indices)
+            names.append(name)
+        return names, np.array(rows, dtype=np.int32).reshape(-1, 2)
+
+    @staticmethod
+    def export(output_dir: str,
+               styles: List[str],
+               path: Optional[str] = None,
+               workers: int = WORKERS,
+               extension: str = "PNG") -> Dict[str, int]:
+        """
+        Pack the rendered images of every style, decoding them in parallel.
+        Missing images are left as zeros and reported.
+        :param output_dir: render output folder.
+        :param styles: styles to export.
+        :param path: tensors folder, output_dir/tensors by default.
+        :param workers: decoding threads, the file reads and zlib release the GIL.
+        :param extension: images extension.
+        :return: amount of missing images of each style.
+        """
+        path = path or os.path.join(output_dir, "tensors")
+        os.makedirs(path, exist_ok=True)
+
+        names, rows = TensorExport.rows(output_dir)
+        with open(os.path.join(path, TensorStore.OBJECTS), "w") as fw:
+            json.dump(names, fw)
+
+        def image_path(row, style: str) -> str:
+            return os.path.join(output_dir, names[row[0]], str(row[1]), f"{style}.{extension}")
+
+        missing = {}
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for style in styles:
+                paths = [image_path(row, style) for row in rows]
+                first = next((p for p in paths if os.path.exists(p)), None)
+                if first is None:
+                    missing[style] = len(paths)
+                    continue
+
+                store = TensorStore(path, style, rows, PngReader.read(first).shape)
+
+                def fill(i: int) -> bool:
+                    if not os.path.exists(paths[i]):
+                        return False
+                    store.write(i, PngReader.read(paths[i]))
+                    return True
+
+                missing[style] = sum(not done for done in pool.map(fill, range(len(paths))))
+                store.close()
+                print(f"{style}: {len(paths) - missing[style]} images packed, {missing[style]} missing")
+
+        return missing
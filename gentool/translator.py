@@ -1,17 +1,27 @@
+import colorsys
 import json
 import os
+import time
 import webbrowser
 import csv
 
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from threading import Thread
-from typing import Dict, List
 
-from .basics import Environment, Object, Light, Viewpoint, Render, Material
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Union
 
+import numpy as np
 
-def process(o: Object) -> Dict:
-    o.material = o.material.__dict__
-    return o.__dict__
+from .basics import Environment, Object, Light, Viewpoint, Render, Material
+from .benchmarks import Benchmarks
+from .catalog import Catalog
+from .meshio import MeshWriter
+from .objectcsv import ObjectCsv
+from .profiling import Profiler
+from .resample import Resampler
+from .sampleindex import SampleIndex
+from .sweep import Sweep
 
 
 def reconstruct(o: Dict) -> Object:
@@ -20,11 +30,58 @@ def reconstruct(o: Dict) -> Object:
     return Object(**o)
 
 
+def reconstruct_objects(objects: Union[List[Dict], Dict]) -> Iterable[Object]:
+    """
+    Objects could be a list of objects or a catalog like
+    {"source": "models/**/*.obj", "material": {...}, "normalize": true}
+    """
+    if isinstance(objects, dict):
+        catalog = dict(objects)
+        catalog.update({'material': Material(**(catalog.get('material')))})
+        return Catalog(**catalog)
+    return [reconstruct(o) for o in objects]
+
+
+def snapshot(instance) -> object:
+    """
+    Non-mutating recursive copy of an instance attributes, useful to compare
+    configurations between runs.
+    :param instance: basics instance, list or plain value.
+    :return: plain python structure.
+    """
+    if isinstance(instance, (list, tuple)):
+        return [snapshot(i) for i in instance]
+    if isinstance(instance, dict):
+        return {k: snapshot(v) for k, v in instance.items()}
+    if hasattr(instance, "__dict__"):
+        return snapshot(instance.__dict__)
+    return instance
+
+
+def instance_color(i: int) -> tuple:
+    """
+    Segmentation color of an instance, hues are spread with the golden ratio
+    so consecutive instances are easy to tell apart.
+    """
+    r, g, b = colorsys.hsv_to_rgb((i * 0.618033988749895) % 1, 1, 1)
+    return r, g, b, 1
+
+
+def instance_rgb(i: int) -> tuple:
+    """
+    The 8 bits color of an instance in the segmentation images, its linear
+    color through the sRGB curve of the Standard view transform.
+    """
+    linear = np.array(instance_color(i)[:3])
+    srgb = np.where(linear <= 0.0031308, linear * 12.92, 1.055 * linear ** (1 / 2.4) - 0.055)
+    return tuple(np.rint(srgb * 255).astype(int).tolist())
+
+
 class Config:
     def __init__(self,
                  environment: Environment,
                  render: Render,
-                 objects: List[Object],
+                 objects: Iterable[Object],
                  lights: List[Light],
                  viewpoints: List[Viewpoint]):
         assert environment is not None, "environment cant be None!"
@@ -41,37 +98,151 @@ class Config:
         self.render = render
 
 
+class ConfigDiff:
+    ENVIRONMENT = "environment"
+    OBJECTS = "objects"
+    LIGHTS = "lights"
+    VIEWPOINTS = "viewpoints"
+    RENDER = "render"
+
+    SECTIONS = (ENVIRONMENT, OBJECTS, LIGHTS, VIEWPOINTS, RENDER)
+
+    @staticmethod
+    def snapshot(config: Config) -> Dict:
+        """
+        Takes a snapshot of every config section.
+        :param config: the Config
+        :return: a dict section -> plain values.
+        """
+        return {section: snapshot(getattr(config, section)) for section in ConfigDiff.SECTIONS}
+
+    @staticmethod
+    def changed(previous: Optional[Dict], current: Dict) -> Set[str]:
+        """
+        Compare two config snapshots.
+        :param previous: previous snapshot, None if there is no one.
+        :param current: current snapshot.
+        :return: the set of sections that changed.
+        """
+        if previous is None:
+            return set(ConfigDiff.SECTIONS)
+        return {section for section in ConfigDiff.SECTIONS if previous.get(section) != current.get(section)}
+
+
+class JsonLinesObjects:
+    """
+    Objects of a JSON Lines config, one object per line after the header.
+    The file is read on each iteration, so objects are never all in memory.
+    """
+    def __init__(self, path: str):
+        self.path = path
+
+    def __iter__(self) -> Iterator[Object]:
+        with open(self.path, "r") as fr:
+            next(fr, None)  # header
+            for line in fr:
+                if line.strip():
+                    yield reconstruct(json.loads(line))
+
+    def count(self) -> int:
+        """
+        Amount of objects, without creating any Object.
+        """
+        with open(self.path, "r") as fr:
+            next(fr, None)  # header
+            return sum(1 for line in fr if line.strip())
+
+
 class ConfigIO:
+    JSON_LINES = ".jsonl"
+
     @staticmethod
-    def json_dumps(instance: Config, path: str):
-        config = {
-            "environment": instance.environment.__dict__,
-            "objects": [process(obj) for obj in instance.objects],
-            "lights": [light.__dict__ for light in instance.lights],
-            "viewpoints": [viewpoint.__dict__ for viewpoint in instance.viewpoints],
-            "render": instance.render.__dict__
+    def dumps_header(instance: Config) -> Dict:
+        return {
+            "environment": snapshot(instance.environment),
+            "lights": snapshot(instance.lights),
+            "viewpoints": snapshot(instance.viewpoints),
+            "render": snapshot(instance.render)
         }
 
+    @staticmethod
+    def json_dumps(instance: Config, path: str, quiet: bool = False):
+        config = ConfigIO.dumps_header(instance)
+        config["objects"] = snapshot(instance.objects) if isinstance(instance.objects, Catalog) \
+            else [snapshot(obj) for obj in instance.objects]
+
         if path is not None:
             with open(path, "w") as fw:
                 fw.write(json.dumps(config, indent=4, sort_keys=True))
 
-        print(config)
+        if not quiet:
+            print(config)
+
+    @staticmethod
+    def loads_header(config: Dict, objects: Iterable[Object]) -> Config:
+        """
+        Build a Config from a header made by ConfigIO.dumps_header
+        :param config: the header.
+        :param objects: the config objects.
+        """
+        return Config(
+            environment=Environment(**config.get("environment")),
+            objects=objects,
+            lights=[Light(**li) for li in config.get("lights")],
+            viewpoints=[Viewpoint(**v) for v in config.get("viewpoints")],
+            render=Render(**config.get("render"))
+        )
 
     @staticmethod
     def json_loads(path: str):
         with open(path, "r") as fr:
             config = json.load(fr)
 
-        config = {
-            "environment": Environment(**config.get("environment")),
-            "objects": [reconstruct(o) for o in config.get("objects")],
-            "lights": [Light(**li) for li in config.get("lights")],
-            "viewpoints": [Viewpoint(**v) for v in config.get("viewpoints")],
-            "render": Render(**config.get("render"))
-        }
+        return ConfigIO.loads_header(config, reconstruct_objects(config.get("objects")))
+
+    @staticmethod
+    def jsonl_dumps(instance: Config, path: str):
+        """
+        Write a JSON Lines config: the first line has the environment, lights,
+        viewpoints and render, then one object per line. Objects are written
+        as they are iterated. A catalog is kept in the header.
+        :param instance: the Config, it's not modified.
+        :param path: output path.
+        """
+        header = ConfigIO.dumps_header(instance)
+        catalog = isinstance(instance.objects, Catalog)
+        if catalog:
+            header["objects"] = snapshot(instance.objects)
+
+        with open(path, "w") as fw:
+            fw.write(json.dumps(header, sort_keys=True) + "\n")
+            if not catalog:
+                for obj in instance.objects:
+                    fw.write(json.dumps(snapshot(obj), sort_keys=True) + "\n")
+
+    @staticmethod
+    def jsonl_loads(path: str):
+        """
+        Load a JSON Lines config, objects are read lazily.
+        :param path: config path.
+        """
+        with open(path, "r") as fr:
+            config = json.loads(fr.readline())
 
-        return Config(**config)
+        objects = config.get("objects")
+        return ConfigIO.loads_header(
+            config, JsonLinesObjects(path) if objects is None else reconstruct_objects(objects)
+        )
+
+    @staticmethod
+    def loads(path: str):
+        """
+        Load a JSON or a JSON Lines config, depending on the extension.
+        :param path: config path.
+        """
+        if os.path.splitext(path)[1].lower() == ConfigIO.JSON_LINES:
+            return ConfigIO.jsonl_loads(path)
+        return ConfigIO.json_loads(path)
 
 
 class DataGenFunctsInterface:
@@ -84,19 +255,22 @@ class DataGenFunctsInterface:
         """
         pass
 
-    def create_viewpoints(self, vs: List[Viewpoint], preview: bool):
+    def create_viewpoints(self, vs: List[Viewpoint], preview: bool, rng: Optional[np.random.RandomState] = None):
         """
         Create the viewpoints of the camera
         :param vs: a list of Viewpoints objects.
         :param preview: if true, returns only 1 coord.
-        :return:
+        :param rng: random generator of the poses, numpy's global one by default.
+        :return: a list with an iterable of (x, y, z) for each viewpoint,
+        poses could be generated lazily so each iterable is consumed once.
         """
         pass
 
-    def create_light(self, li: Light):
+    def create_light(self, li: Light, rng: Optional[np.random.RandomState] = None):
         """
         Create a light based on params of light
         :param li: Light
+        :param rng: random generator, numpy's global one by default.
         :return: None
         """
         pass
@@ -126,7 +300,7 @@ class DataGenFunctsInterface:
         """
         pass
 
-    def render(self, path: str, render_style: str, texture: str, object_loaded):
+    def render(self, path: str, render_style: str, texture: str, object_loaded, material_params: tuple = None):
         """
         This method renders the image based on input render style.
         This should be one of RenderManager.Kind variables.
@@ -134,7 +308,66 @@ class DataGenFunctsInterface:
         :param render_style: Style to apply.
         :param object_loaded: Object to apply the style.
         :param texture: object texture
-        :return: None
+        :param material_params: metallic, specular, roughness, hue and texture
+        scale of the material, NaN or None values keep the material ones.
+        :return: the rendered image path, None if the style is unknown.
+        """
+        pass
+
+    def render_frames(self, paths: List[str], render_style: str, texture: str, object_loaded,
+                      material_params: tuple = None, first_frame: int = 1):
+        """
+        Render consecutive frames of the animation set with animate in a
+        single call, frame first_frame + i is saved in paths[i].
+        :param paths: folder of each frame.
+        :return: the rendered images paths, None if the style is unknown.
+        """
+        pass
+
+    def render_views(self, paths: List[str], render_style: str, texture: str, object_loaded, cameras: List,
+                     material_params: tuple = None):
+        """
+        Render a style from the cameras of a rig. The scene does not change
+        between the views, the material and the world are set once and only
+        the active camera is switched; cameras[i] is saved in paths[i].
+        :param paths: folder of each view.
+        :param cameras: the rig cameras, made by create_rig.
+        :return: the rendered images paths, None if the style is unknown.
+        """
+        pass
+
+    def create_rig(self, camera, amount: int) -> List:
+        """
+        Cameras of a rig: the camera plus amount - 1 cameras with the same
+        settings and target.
+        :return: references to the cameras, the camera first.
+        """
+        pass
+
+    def remove_rig(self, cameras: List):
+        """
+        Remove the cameras added by create_rig, the first one is kept as the
+        active camera.
+        """
+        pass
+
+    def animate(self, camera, poses: np.ndarray, lights: np.ndarray, instances: List = (),
+                instances_params: np.ndarray = None, first_frame: int = 1):
+        """
+        Keyframe the camera poses, the lights and the clutter instances of a
+        batch of viewpoints on consecutive frames.
+        :param camera: the camera.
+        :param poses: (n, 3) camera locations.
+        :param lights: (n, lights, 7) lights params, NaN lights are turned off.
+        :param instances: references to the clutter instances.
+        :param instances_params: (n, len(instances), 7) instances poses.
+        :param first_frame: frame of the first viewpoint.
+        """
+        pass
+
+    def clear_animation(self, camera, instances: List = ()):
+        """
+        Remove the keyframes and the animated lights.
         """
         pass
 
@@ -159,13 +392,24 @@ class DataGenFunctsInterface:
         """
         pass
 
-    def define_texture(self, o: Object):
+    def define_texture(self, o: Object, rng: Optional[np.random.RandomState] = None):
         """
         This method returns a texture to show in the object.
         :param o: Object config params
+        :param rng: random generator of RANDOM textures, numpy's global one by default.
         """
         pass
     
+    def create_light_from_params(self, color: tuple, location: tuple, energy: float):
+        """
+        Create a light with already sampled params.
+        :param color: rgb color.
+        :param location: light location.
+        :param energy: light energy.
+        :return: reference to the light.
+        """
+        pass
+
     def get_light_params(self, light: Light):
         """
         Returns light location and color
@@ -173,110 +417,641 @@ class DataGenFunctsInterface:
         """
         pass
     
-    def export_normalized_object(self, path):
+    def export_normalized_object(self, path, object_loaded):
         """
         Save the object normalized.
-        :param path: output params.
+        :param path: output params, the extension sets the format.
+        :param object_loaded: reference to the object.
         """
         pass
     
-    def clear_objects(self):
+    def clear_objects(self, keep: List = ()):
         """
         Clear the scene objects.
+        :param keep: references to the objects to keep.
+        """
+        pass
+
+    def remove_object(self, object_loaded):
+        """
+        Remove a single loaded object from the scene.
+        :param object_loaded: reference to the object.
+        """
+        pass
+
+    def is_alive(self, object_loaded) -> bool:
+        """
+        Check that a reference is still in the scene, the user can delete
+        objects or load another file between operators.
+        :param object_loaded: reference to the object.
+        """
+        pass
+
+    def track_datablocks(self):
+        """
+        Record the datablocks that exist now, the user's ones. They are never
+        purged, purge_orphans only removes the ones created after.
+        """
+        pass
+
+    def purge_orphans(self):
+        """
+        Remove the datablocks created since track_datablocks and left without
+        users after clearing the scene.
+        :return: amount of datablocks removed.
+        """
+        pass
+
+    def memory_usage(self) -> Dict:
+        """
+        Returns the process RSS in bytes and the amount of datablocks by type.
+        """
+        pass
+
+    def create_instances(self, sources: List, amount: int) -> List:
+        """
+        Create linked duplicates of loaded objects, sharing their mesh data,
+        for clutter scenes. Each instance and the first source get a different
+        segmentation color, the other sources are hidden from render.
+        :param sources: references to the loaded objects, the object first.
+        :param amount: amount of instances, instance i duplicates source
+        i % len(sources).
+        :return: references to the instances.
+        """
+        pass
+
+    def move_instances(self, instances: List, params: np.ndarray):
+        """
+        Set the pose of the clutter instances.
+        :param instances: references to the instances.
+        :param params: (len(instances), 7) location, rotation and scale.
+        """
+        pass
+
+    def load_hdris(self, paths: List[str]):
+        """
+        Preload the HDRIs used for the environment lighting.
+        :param paths: images paths, empty for the default one.
         """
         pass
 
+    def use_hdri(self, path: Optional[str]):
+        """
+        Set the HDRI of the environment lighting of the next renders.
+        :param path: image path, None for the first one preloaded.
+        """
+        pass
+
+    def warm_up(self):
+        """
+        Load the assets shared by every render (library materials, worlds),
+        so a long-lived process pays for them once.
+        """
+        pass
+
+
+class PreviewSession:
+    """
+    Keeps the loaded model, the camera and the materials alive between
+    previews and only rebuilds the parts of the scene whose config changed.
+    """
+    PREVIEW_FOLDER = "preview"
+
+    def __init__(self, functs: DataGenFunctsInterface):
+        self.functs = functs
+        self.reset()
+
+    def reset(self):
+        self.previous = None
+        self.camera = None
+        self.object_loaded = None
+        self.coords = None
+        self.texture = None
+
+    def render(self, config: Config) -> str:
+        """
+        Render a preview of the first object of the config.
+        :param config: the Config
+        :return: the folder where the preview was saved.
+        """
+        # The scene changed under the session, everything is built again.
+        references = (self.camera, self.object_loaded)
+        if any(ref is not None and not self.functs.is_alive(ref) for ref in references):
+            self.close()
+
+        current = ConfigDiff.snapshot(config)
+        changed = ConfigDiff.changed(self.previous, current)
+        obj = next(iter(config.objects), None)
+        assert obj is not None, "The config has no objects!"
+
+        if self.camera is None:
+            self.functs.track_datablocks()
+            self.camera = self.functs.create_camera()
+
+        # The model normalization depends on the environment.
+        if self.object_loaded is None or changed & {ConfigDiff.ENVIRONMENT, ConfigDiff.OBJECTS}:
+            if self.object_loaded is not None:
+                self.functs.remove_object(self.object_loaded)
+            self.object_loaded = self.functs.load_object(obj, size_env=config.environment.dimension)
+            self.object_loaded.select_set(True)
+            self.texture = self.functs.define_texture(obj)
+            self.functs.load_hdris(config.environment.hdris)
+
+        if self.coords is None or ConfigDiff.VIEWPOINTS in changed:
+            self.coords = self.functs.create_viewpoints(config.viewpoints, preview=True)[0][0]
+            self.functs.move_camara_to(self.camera, self.coords)
+
+        if ConfigDiff.LIGHTS in changed:
+            self.functs.clear_lights()
+            for light in config.lights:
+                self.functs.create_light(Sweep.pin(light, Sweep.LIGHT_FIELDS))
+
+        if ConfigDiff.RENDER in changed:
+            self.functs.set_render_resolution(config.render)
+
+        path = os.path.join(config.render.output_dir_path, obj.name, PreviewSession.PREVIEW_FOLDER)
+        os.makedirs(path, exist_ok=True)
+
+        for render_style in config.render.styles:
+            self.functs.render(
+                path=path,
+                render_style=render_style,
+                texture=self.texture,
+                object_loaded=self.object_loaded
+            )
+
+        self.previous = current
+        return path
+
+    def close(self):
+        """
+        Remove everything the session created.
+        """
+        self.functs.clear_objects()
+        self.functs.purge_orphans()
+        self.reset()
+
+
 class DatasetsGenerator(Thread):
-    def __init__(self, config: Config, functs: DataGenFunctsInterface, preview: bool):
+    MEMORY_REPORT = "memory.csv"
+    BENCHMARKS = "benchmarks.json"
+    INSTANCES = "instances.csv"
+
+    def __init__(self, config: Config, functs: DataGenFunctsInterface, preview: bool, plan,
+                 profiler: Optional[Profiler] = None):
+        """
+        :param config: the Config
+        :param functs: the functs implementation.
+        :param preview: if true, renders only 1 viewpoint.
+        :param plan: the jobs to render, a planner.JobPlanner, a planner.JobPlan or a jobqueue.QueueWorker
+        :param profiler: if given, profiles the objects and takes memory snapshots between them.
+        """
         super(DatasetsGenerator, self).__init__()
 
         self.config = config
         self.functs = functs
         self.preview = preview
+        self.plan = plan
+        self.profiler = profiler
 
-    def run(self):
-        
-        # self.functs.create_environment(self.config.environment)
+        # The smaller resolutions are written while the next images render.
+        self.resampling = ThreadPoolExecutor(max_workers=os.cpu_count()) if config.render.resolutions else None
+        self.resampled = []
 
-        for obj in self.config.objects:
-            
-            camera = self.functs.create_camera()
-            viewpoints = self.functs.create_viewpoints(self.config.viewpoints, self.preview)
-            
-            # Load the object and store the reference.
-            object_loaded = self.functs.load_object(obj, size_env=self.config.environment.dimension)
-            object_loaded.select_set(True)
-
-            obj_path = os.path.join(self.config.render.output_dir_path, obj.name)
-            
-            # Create an object folder
-            os.makedirs(obj_path)
-           
-            # Export normalized object
-            if obj.normalize:
-                self.functs.export_normalized_object(path=os.path.join(obj_path, f"{obj.name}_normalized.obj"))
-            
-            # Create the headers for saving lights in csv. 
-            lights_list = [
-                (f"light_{i}-x", f"light_{i}-y", f"light_{i}-z", f"light_{i}_e")
-                for i, _ in enumerate(self.config.lights)
-            ]
-            lights_list = [item for sublist in lights_list for item in sublist]
-            
-            # Create the csv headers.
-            data_csv_list = [
-                ['index', 'view-x', 'view-y', 'view-z', 'texture'],
-            ]
-            
-            index = 0
-            
-            # Iterate over viewpoint
-            for viewpoint in viewpoints:
-                
-                # Iterate over each viewpoint coordinate tuple (x, y, z)
-                for coords in viewpoint:
-                    
-                    data_csv_list_item = [index, *coords]
-                    
-                    # Move the camera to the coordinates
-                    self.functs.move_camara_to(camera, coords)
-                    
-                    # Create the lights
-                    for light in self.config.lights:
-                        li = self.functs.create_light(light)
-                        # data_csv_list_item += self.functs.get_light_params(li)
-                    
-                    # Create the folder for saving the model renders.
-                    path_render_index = os.path.join(obj_path, f"{index}")
-                    os.makedirs(path_render_index)
-                    
-                    # Set the render configurations to render the diferent styles.
-                    self.functs.set_render_resolution(self.config.render)
-                    
-                    texture = self.functs.define_texture(obj)
-                    data_csv_list_item += [texture]
-                    
-                    for render_style in self.config.render.styles:
-                        self.functs.render(
-                            path=path_render_index,
-                            render_style=render_style,
+        self.benchmarks_path = os.path.join(config.render.output_dir_path, DatasetsGenerator.BENCHMARKS)
+        self.benchmarks = Benchmarks.load(self.benchmarks_path)
+
+        os.makedirs(config.render.output_dir_path, exist_ok=True)
+        self.index = SampleIndex.open(config.render.output_dir_path)
+
+    def render(self, path: str, render_style: str, texture: str, object_loaded, material_params: tuple = None):
+        """
+        Render a style and record how long it took for later estimates.
+        """
+        start = time.perf_counter()
+        output = self.functs.render(
+            path=path,
+            render_style=render_style,
+            texture=texture,
+            object_loaded=object_loaded,
+            material_params=material_params
+        )
+        outputs = [output] if output is not None else []
+        self.record(render_style, time.perf_counter() - start, outputs)
+        self.resample(render_style, outputs)
+
+    def render_frames(self, paths: List[str], render_style: str, texture: str, object_loaded,
+                      material_params: tuple = None, first_frame: int = 1):
+        """
+        Render frames of an animation and record how long each one took.
+        """
+        start = time.perf_counter()
+        outputs = self.functs.render_frames(
+            paths=paths,
+            render_style=render_style,
+            texture=texture,
+            object_loaded=object_loaded,
+            material_params=material_params,
+            first_frame=first_frame
+        )
+        self.record(render_style, time.perf_counter() - start, outputs or [])
+        self.resample(render_style, outputs or [])
+
+    def render_views(self, paths: List[str], render_style: str, texture: str, object_loaded, cameras: List,
+                     material_params: tuple = None):
+        """
+        Render the views of a rig and record how long each one took.
+        """
+        start = time.perf_counter()
+        outputs = self.functs.render_views(
+            paths=paths,
+            render_style=render_style,
+            texture=texture,
+            object_loaded=object_loaded,
+            cameras=cameras,
+            material_params=material_params
+        )
+        self.record(render_style, time.perf_counter() - start, outputs or [])
+        self.resample(render_style, outputs or [])
+
+    def resample(self, render_style: str, outputs: List[str]):
+        """
+        Queue the copies of the rendered images in the configured resolutions.
+        """
+        if self.resampling is None:
+            return
+        for output in outputs:
+            self.resampled.append(self.resampling.submit(
+                Resampler.write_resolutions, output, render_style, self.config.render.resolutions
+            ))
+
+    def wait_resampled(self):
+        """
+        Wait for the copies, errors are raised here.
+        """
+        for future in self.resampled:
+            future.result()
+        self.resampled = []
+
+    def close(self):
+        """
+        Release the sample index and the resampling threads. After a failure
+        the copies not started yet are dropped, the batch was not finished.
+        """
+        self.index.close()
+        if self.resampling is not None:
+            for future in self.resampled:
+                future.cancel()
+            self.resampled = []
+            self.resampling.shutdown()
+
+    def record(self, render_style: str, seconds: float, outputs: List[str]):
+        r = self.config.render
+        for output in outputs:
+            if os.path.exists(output):
+                self.benchmarks.record(render_style, seconds / len(outputs), os.path.getsize(output),
+                                       r.resolution_x, r.resolution_y)
+
+    def report_memory(self, obj: Object):
+        """
+        Append the memory usage after an object was cleared to the run report,
+        memory.csv, this should stay flat along the run.
+        :param obj: the object just finished.
+        """
+        if self.profiler is not None:
+            self.profiler.snapshot(obj.name)
+
+        usage = self.functs.memory_usage()
+        if not usage:
+            return
+
+        report_path = os.path.join(self.config.render.output_dir_path, DatasetsGenerator.MEMORY_REPORT)
+        new_report = not os.path.exists(report_path)
+        with open(report_path, "a", newline="") as f:
+            writer = csv.writer(f)
+            if new_report:
+                writer.writerow(['object', *usage.keys()])
+            writer.writerow([obj.name, *usage.values()])
+
+    def profile_object(self, obj: Object):
+        return self.profiler.object(obj.name) if self.profiler is not None else nullcontext()
+
+    def profile_viewpoint(self, index: int):
+        return self.profiler.viewpoint(index) if self.profiler is not None else nullcontext()
+
+    def hdri_of(self, job) -> Optional[str]:
+        """
+        The HDRI path of a job, None for the default one.
+        """
+        return self.config.environment.hdris[job['hdri']] if job['hdri'] >= 0 else None
+
+    @staticmethod
+    def light_values(lights: np.ndarray) -> List[float]:
+        """
+        The lights params of a job in the csv order: x, y, z, energy, r, g, b
+        for each light. A light that was not created is written as nan.
+        :param lights: the job lights params.
+        """
+        return lights[:, [3, 4, 5, 6, 0, 1, 2]].ravel().tolist()
+
+    def create_lights(self, lights: np.ndarray):
+        """
+        Create the lights of a job.
+        :param lights: the job lights params.
+        """
+        for params in lights:
+            if np.isnan(params).any():
+                continue
+            self.functs.create_light_from_params(
+                color=tuple(params[0:3].tolist()),
+                location=tuple(params[3:6].tolist()),
+                energy=float(params[6])
+            )
+
+    def write_instances(self, path: str, instances: np.ndarray, models: int):
+        """
+        Save the clutter instances of a viewpoint with their color in the
+        instance segmentation images. Instance 0 is the object, it has no pose.
+        :param path: viewpoint folder.
+        :param instances: the job instances params.
+        :param models: amount of models of the scene.
+        """
+        with open(os.path.join(path, DatasetsGenerator.INSTANCES), "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(['instance', 'model', 'x', 'y', 'z', 'rotation-x', 'rotation-y', 'rotation-z', 'scale',
+                             'r', 'g', 'b'])
+            writer.writerow([0, 0, *[""] * instances.shape[1], *instance_rgb(0)])
+            for i, params in enumerate(instances):
+                writer.writerow([i + 1, i % models, *params.tolist(), *instance_rgb(i + 1)])
+
+    def render_viewpoints(self, jobs: np.ndarray, camera, object_loaded, obj_path: str,
+                          instances: List = (), models: int = 1):
+        """
+        Render a batch of jobs of an object.
+        :param jobs: jobs sorted by viewpoint, all the styles of a viewpoint in the same batch.
+        :param instances: references to the clutter instances.
+        :param models: amount of models of the clutter scene.
+        :return: iterator of the csv rows of the rendered viewpoints.
+        """
+        # Iterate over the viewpoints, each one has a job per style.
+        bounds = np.flatnonzero(np.diff(jobs['viewpoint'])) + 1
+        for viewpoint_jobs in np.split(jobs, bounds):
+            job = viewpoint_jobs[0]
+            index = int(job['viewpoint'])
+            coords = tuple(job['pose'].tolist())
+
+            with self.profile_viewpoint(index):
+                data_csv_list_item = [index, *coords]
+
+                # Move the camera to the coordinates
+                self.functs.move_camara_to(camera, coords)
+
+                # Create the lights
+                self.create_lights(job['lights'])
+                self.functs.use_hdri(self.hdri_of(job))
+
+                # Create the folder for saving the model renders. A job whose lease
+                # expired in a job queue is rendered again into the same folder.
+                path_render_index = os.path.join(obj_path, f"{index}")
+                os.makedirs(path_render_index, exist_ok=True)
+
+                if instances:
+                    self.functs.move_instances(instances, job['instances'])
+                    self.write_instances(path_render_index, job['instances'], models)
+
+                texture = self.plan.textures[job['texture']]
+                data_csv_list_item += [texture, self.hdri_of(job) or "", *job['material'].tolist(),
+                                       *DatasetsGenerator.light_values(job['lights'])]
+
+                for style_job in viewpoint_jobs:
+                    self.render(
+                        path=path_render_index,
+                        render_style=self.plan.styles[style_job['style']],
+                        texture=texture,
+                        object_loaded=object_loaded,
+                        material_params=tuple(style_job['material'].tolist())
+                    )
+
+                # Clear the lights
+                self.functs.clear_lights()
+            # The row for csv saving.
+            yield data_csv_list_item
+
+    def render_rigs(self, jobs: np.ndarray, camera, object_loaded, obj_path: str,
+                    instances: List = (), models: int = 1):
+        """
+        Render a batch of jobs of an object rig by rig. The viewpoints of a rig
+        share the lights, the material and the clutter, so the scene is set
+        once and each style is rendered from all the rig cameras in a row.
+        :param jobs: jobs sorted by viewpoint, all the styles of a viewpoint in the same batch.
+        :param instances: references to the clutter instances.
+        :param models: amount of models of the clutter scene.
+        :return: iterator of the csv rows of the rendered viewpoints.
+        """
+        viewpoints = jobs[np.r_[0, np.flatnonzero(np.diff(jobs['viewpoint'])) + 1]]
+        _, sizes = np.unique(viewpoints['rig'], return_counts=True)
+        cameras = self.functs.create_rig(camera, int(sizes.max()))
+
+        try:
+            bounds = np.flatnonzero(np.diff(jobs['rig'])) + 1
+            for rig_jobs in np.split(jobs, bounds):
+                views = rig_jobs[np.r_[0, np.flatnonzero(np.diff(rig_jobs['viewpoint'])) + 1]]
+                job = views[0]
+                texture = self.plan.textures[job['texture']]
+
+                with self.profile_viewpoint(int(job['viewpoint'])):
+                    for view_camera, pose in zip(cameras, views['pose']):
+                        self.functs.move_camara_to(view_camera, tuple(pose.tolist()))
+                    self.create_lights(job['lights'])
+                    self.functs.use_hdri(self.hdri_of(job))
+                    if instances:
+                        self.functs.move_instances(instances, job['instances'])
+
+                    paths = []
+                    for view in views:
+                        path_render_index = os.path.join(obj_path, f"{int(view['viewpoint'])}")
+                        os.makedirs(path_render_index, exist_ok=True)
+                        if instances:
+                            self.write_instances(path_render_index, view['instances'], models)
+                        paths.append(path_render_index)
+
+                    for style in np.unique(rig_jobs['style']):
+                        style_job = rig_jobs[rig_jobs['style'] == style][0]
+                        self.render_views(
+                            paths=paths,
+                            render_style=self.plan.styles[style],
                             texture=texture,
-                            object_loaded=object_loaded
+                            object_loaded=object_loaded,
+                            cameras=cameras[:len(views)],
+                            material_params=tuple(style_job['material'].tolist())
                         )
 
-                    # Clear the lights
                     self.functs.clear_lights()
-                    # Append the new row for csv saving.
-                    data_csv_list.append(data_csv_list_item)
-                    index += 1
-
-                # Todo: make UI progress bar.
-            csv_path = os.path.join(obj_path, f"{obj.name}.csv")
-            with open(csv_path, "w", newline="") as f:
-                writer = csv.writer(f)
-                writer.writerows(data_csv_list)
-            
-            self.functs.clear_objects()
+
+                for view in views:
+                    yield [int(view['viewpoint']), *view['pose'].tolist(), texture, self.hdri_of(view) or "",
+                           *view['material'].tolist(), *DatasetsGenerator.light_values(view['lights'])]
+        finally:
+            self.functs.remove_rig(cameras)
+
+    def render_animated(self, jobs: np.ndarray, camera, object_loaded, obj_path: str,
+                        instances: List = (), models: int = 1):
+        """
+        Render a batch of jobs of an object as an animation: the viewpoints
+        are keyframed on consecutive frames and each style is rendered with a
+        call per run of viewpoints sharing the texture and the material.
+        :param jobs: jobs sorted by viewpoint, all the styles of a viewpoint in the same batch.
+        :param instances: references to the clutter instances.
+        :param models: amount of models of the clutter scene.
+        :return: iterator of the csv rows of the rendered viewpoints.
+        """
+        firsts = jobs[np.r_[0, np.flatnonzero(np.diff(jobs['viewpoint'])) + 1]]
+
+        paths = []
+        for job in firsts:
+            path_render_index = os.path.join(obj_path, f"{int(job['viewpoint'])}")
+            os.makedirs(path_render_index, exist_ok=True)
+            if instances:
+                self.write_instances(path_render_index, job['instances'], models)
+            paths.append(path_render_index)
+
+        self.functs.animate(camera, firsts['pose'], firsts['lights'], instances, firsts['instances'])
+
+        for style, render_style in enumerate(self.plan.styles):
+            style_jobs = jobs[jobs['style'] == style]
+            if not len(style_jobs):
+                continue
+
+            # The keyframe of each job, a style can skip viewpoints (a repair plan).
+            frames = np.searchsorted(firsts['viewpoint'], style_jobs['viewpoint'])
+
+            # A new run starts where the frames are not consecutive, or where the
+            # texture, the HDRI or the material changes, NaN included.
+            materials = np.where(np.isnan(style_jobs['material']), -1, style_jobs['material'])
+            changes = (np.diff(frames) != 1) | (np.diff(style_jobs['texture']) != 0) | \
+                      (np.diff(style_jobs['hdri']) != 0) | (np.diff(materials, axis=0) != 0).any(axis=1)
+            starts = np.r_[0, np.flatnonzero(changes) + 1]
+            ends = np.r_[starts[1:], len(style_jobs)]
+
+            for start, end in zip(starts, ends):
+                job = style_jobs[start]
+                first_frame = int(frames[start])
+                self.functs.use_hdri(self.hdri_of(job))
+                # A run is sampled by its first viewpoint.
+                with self.profile_viewpoint(int(job['viewpoint'])):
+                    self.render_frames(
+                        paths=paths[first_frame:first_frame + end - start],
+                        render_style=render_style,
+                        texture=self.plan.textures[job['texture']],
+                        object_loaded=object_loaded,
+                        material_params=tuple(job['material'].tolist()),
+                        first_frame=first_frame + 1
+                    )
+
+        self.functs.clear_animation(camera, instances)
+
+        for job in firsts:
+            yield [int(job['viewpoint']), *job['pose'].tolist(), self.plan.textures[job['texture']],
+                   self.hdri_of(job) or "", *job['material'].tolist(), *DatasetsGenerator.light_values(job['lights'])]
+
+    def render_object(self, obj: Object, batches: Iterable[np.ndarray], camera):
+        """
+        Load an object and render its jobs, the metadata rows are appended to
+        the object csv.
+        :param obj: the object.
+        :param batches: batches of jobs of the object.
+        :param camera: reference to the camera.
+        :return: references to everything loaded, the object first.
+        """
+        e = self.config.environment
+
+        # Load the object and store the reference.
+        object_loaded = self.functs.load_object(obj, size_env=e.dimension)
+        object_loaded.select_set(True)
+
+        # Clutter scenes: the companions models and the instances of all of them.
+        sources, instances = [object_loaded], []
+        if e.clutter:
+            sources += [
+                self.functs.load_object(
+                    Object(name=obj.name, path=path, material=obj.material, normalize=obj.normalize),
+                    size_env=e.dimension
+                )
+                for path in obj.companions
+            ]
+            instances = self.functs.create_instances(sources, e.clutter)
+
+        obj_path = os.path.join(self.config.render.output_dir_path, obj.name)
+
+        # Create an object folder
+        os.makedirs(obj_path, exist_ok=True)
+
+        # Export normalized object, unless a previous run already did it.
+        normalized_path = os.path.join(obj_path, f"{obj.name}_normalized.{obj.export_format}")
+        normalized_settings = f"dimension={e.dimension} format={obj.export_format}"
+        if obj.normalize and not MeshWriter.is_fresh(normalized_path, obj.path, normalized_settings):
+            self.functs.export_normalized_object(path=normalized_path, object_loaded=object_loaded)
+            MeshWriter.stamp(normalized_path, normalized_settings)
+
+        # Create the headers for saving lights in csv.
+        lights_list = [
+            (f"light_{i}-x", f"light_{i}-y", f"light_{i}-z", f"light_{i}_e",
+             f"light_{i}-r", f"light_{i}-g", f"light_{i}-b")
+            for i, _ in enumerate(self.config.lights)
+        ]
+        lights_list = [item for sublist in lights_list for item in sublist]
+
+        # Set the render configurations to render the diferent styles.
+        self.functs.set_render_resolution(self.config.render)
+
+        # Rows are written as viewpoints are rendered, so memory does
+        # not depend on the amount of viewpoints. The viewpoints of an
+        # object could be split between several workers of a job queue.
+        object_csv = ObjectCsv(
+            os.path.join(obj_path, f"{obj.name}.csv"),
+            ['index', 'view-x', 'view-y', 'view-z', 'texture', 'hdri', *Sweep.MATERIAL_FIELDS, *lights_list]
+        )
+
+        for jobs in batches:
+            render_jobs = self.render_viewpoints
+            if self.config.render.animation:
+                render_jobs = self.render_animated
+            elif len(np.unique(jobs['rig'])) < len(np.unique(jobs['viewpoint'])):
+                render_jobs = self.render_rigs
+            rows = []
+            for row in render_jobs(jobs, camera, object_loaded, obj_path,
+                                   instances=instances, models=len(sources)):
+                object_csv.write([row])
+                rows.append(row)
+            # A batch is finished once all its images exist: a job queue
+            # marks its jobs done when the next batch is requested.
+            self.wait_resampled()
+            # Indexed by batch, a single transaction for all its viewpoints.
+            self.index.add(obj.name, rows, [self.plan.styles[style] for style in np.unique(jobs['style'])])
+
+        # Todo: make UI progress bar.
+
+        return [*sources, *instances]
+
+    def run(self):
+
+        # self.functs.create_environment(self.config.environment)
+        self.functs.track_datablocks()
+        self.functs.load_hdris(self.config.environment.hdris)
+
+        try:
+            for obj, batches in self.plan.object_jobs():
+
+                camera = self.functs.create_camera()
+                with self.profile_object(obj):
+                    self.render_object(obj, batches, camera)
+
+                self.functs.clear_objects()
+                self.functs.purge_orphans()
+                self.report_memory(obj)
+                self.benchmarks.save(self.benchmarks_path)
+        finally:
+            self.close()
 
         # Open output folder to see the results.
         webbrowser.open('file:///' + os.path.abspath(self.config.render.output_dir_path))
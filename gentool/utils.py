@@ -1,13 +1,24 @@
+import itertools
 import os
-import random
-from typing import List
-from mathutils import Matrix
+import sys
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional
+from mathutils import Matrix, Vector
 
 import bmesh
 import bpy
+import numpy as np
+
+from bpy_extras.object_utils import world_to_camera_view
+
+try:
+    import resource
+except ImportError:  # Not available on Windows.
+    resource = None
 
 from .basics import Material, Object, Light, Viewpoint, Environment, Render
-from .translator import DataGenFunctsInterface
+from .meshio import MeshFormatError, MeshWriter, ObjReader, PlyReader, StlReader
+from .translator import DataGenFunctsInterface, instance_color
 
 
 class UtilsName:
@@ -145,7 +156,7 @@ class LightCreator:
         @param: kind: 'POINT' or 'SUN'.
         @param: color: light color.
         @param: location: light location.
-        @param: range_position: max & min range to generate randoms locations.
+        @param: energy: light power in watts.
         """
         
         light_data = bpy.data.lights.new(name=UtilsName.light_name, type=kind)
@@ -153,7 +164,7 @@ class LightCreator:
         
         light_object.location = location
         light_data.color = color
-        light_data.energy = 1000
+        light_data.energy = energy
 
         view_layer = bpy.context.view_layer
         view_layer.active_layer_collection.collection.objects.link(light_object)
@@ -161,6 +172,44 @@ class LightCreator:
         return light_object  # reference to the light created.
 
 
+class Animator:
+    @staticmethod
+    def keyframe(id_data, data_path: str, values, first_frame: int = 1):
+        """
+        Keyframe a property on consecutive frames, all the keyframes of a
+        channel are set at once with foreach_set.
+        @param: id_data : the object or datablock to animate.
+        @param: data_path : the property, like "location".
+        @param: values : (frames, channels) or (frames,) array of values.
+        @param: first_frame : frame of the first value.
+        """
+        values = np.asarray(values, dtype=np.float32)
+        values = values.reshape(len(values), -1)
+        frames = np.arange(first_frame, first_frame + len(values), dtype=np.float32)
+
+        if id_data.animation_data is None:
+            id_data.animation_data_create()
+        if id_data.animation_data.action is None:
+            id_data.animation_data.action = bpy.data.actions.new(f"{id_data.name}-Action")
+        fcurves = id_data.animation_data.action.fcurves
+
+        for index in range(values.shape[1]):
+            fcurve = fcurves.find(data_path, index=index) or fcurves.new(data_path, index=index)
+            fcurve.keyframe_points.add(len(values))
+            fcurve.keyframe_points.foreach_set("co", np.column_stack((frames, values[:, index])).ravel())
+            fcurve.update()
+
+    @staticmethod
+    def clear(id_data):
+        """
+        Remove the animation of an object or datablock.
+        """
+        action = id_data.animation_data.action if id_data.animation_data is not None else None
+        id_data.animation_data_clear()
+        if action is not None and action.users == 0:
+            bpy.data.actions.remove(action)
+
+
 def compute_translation(vmin, vmax, respect_to=0.0):
     c = (vmin + vmax) / 2
     d = respect_to - c
@@ -204,12 +253,114 @@ class ObjectNormalizer:
                 continue
             
             coords_prev = coords
-            bpy.ops.transform.transform(mode='TRANSLATION', value=(*coords, 0.0))
-            obj.data.transform(obj.matrix_world)
-            obj.matrix_world = Matrix()
+            # Applied to the mesh, the transform operator would also move
+            # every other selected object.
+            obj.data.transform(Matrix.Translation(coords) @ obj.matrix_basis)
+            obj.matrix_basis = Matrix()
+
+class MeshBuilder:
+    @staticmethod
+    def from_arrays(name: str, vertices, indices, sizes, smooth: bool = False):
+        """
+        Create a mesh object straight from numpy buffers with foreach_set,
+        without going through any import operator.
+        @param: name : object and mesh name.
+        @param: vertices : (N, 3) vertex coordinates.
+        @param: indices : vertex indices of all the polygons, one after another.
+        @param: sizes : amount of vertices of each polygon.
+        @param: smooth : smooth shading for all the polygons.
+        """
+        mesh = bpy.data.meshes.new(name)
+
+        mesh.vertices.add(len(vertices))
+        mesh.vertices.foreach_set("co", np.ascontiguousarray(vertices, dtype=np.float32).ravel())
+
+        mesh.loops.add(len(indices))
+        mesh.loops.foreach_set("vertex_index", np.ascontiguousarray(indices, dtype=np.int32))
+
+        starts = np.zeros(len(sizes), dtype=np.int32)
+        np.cumsum(sizes[:-1], out=starts[1:])
+        mesh.polygons.add(len(sizes))
+        mesh.polygons.foreach_set("loop_start", starts)
+        mesh.polygons.foreach_set("loop_total", np.ascontiguousarray(sizes, dtype=np.int32))
+        if smooth:
+            mesh.polygons.foreach_set("use_smooth", np.ones(len(sizes), dtype=bool))
+
+        mesh.update(calc_edges=True)
+        mesh.validate()
+
+        obj = bpy.data.objects.new(name, mesh)
+        view_layer = bpy.context.view_layer
+        view_layer.active_layer_collection.collection.objects.link(obj)
+
+        return obj  # reference to the object created.
+
+
+def import_with_operator(operator, **kwargs):
+    """
+    Build a loader over a blender import operator. The imported object is
+    the first selected one, parent transforms are kept when unparenting.
+    @param: operator : import operator.
+    """
+    def load(path: str):
+        bpy.ops.object.select_all(action='DESELECT')
+        operator(filepath=path, **kwargs)
+        meshes = [o for o in bpy.context.selected_objects if o.type == 'MESH']
+        obj = meshes[0] if meshes else bpy.context.selected_objects[0]
+        if obj.parent is not None:
+            matrix = obj.matrix_world.copy()
+            obj.parent = None
+            obj.matrix_world = matrix
+        return obj
+
+    return load
+
+
+def import_binary(reader, fallback):
+    """
+    Build a loader that reads the file with a numpy reader and falls back to
+    the import operator when the file is not binary. Like the operator, the
+    new object is left as the only selected one.
+    @param: reader : a meshio reader.
+    @param: fallback : loader used for formats the reader can't handle.
+    """
+    def load(path: str):
+        try:
+            vertices, indices, sizes = reader.read(path)
+        except MeshFormatError:
+            return fallback(path)
+        bpy.ops.object.select_all(action='DESELECT')
+        return MeshBuilder.from_arrays(UtilsName.model_name, vertices, indices, sizes)
+
+    return load
+
+
+def import_obj(fallback):
+    """
+    Build the OBJ loader, it parses the file with the numpy reader and builds
+    the mesh directly, so no materials are created. Like the import
+    operators, the new object is left as the only selected one.
+    @param: fallback : loader used when the file can't be parsed.
+    """
+    def load(path: str):
+        try:
+            (vertices, indices, sizes), smooth = ObjReader.load(path)
+        except MeshFormatError:
+            return fallback(path)
+        bpy.ops.object.select_all(action='DESELECT')
+        return MeshBuilder.from_arrays(UtilsName.model_name, vertices, indices, sizes, smooth=smooth)
+
+    return load
+
 
 class ObjectIO:
-    extensions_allowed = {'.obj': bpy.ops.import_scene.obj}
+    extensions_allowed = {
+        '.obj': import_obj(fallback=import_with_operator(bpy.ops.import_scene.obj, use_smooth_groups=True)),
+        '.ply': import_binary(PlyReader, fallback=import_with_operator(bpy.ops.import_mesh.ply)),
+        '.stl': import_binary(StlReader, fallback=import_with_operator(bpy.ops.import_mesh.stl)),
+        '.gltf': import_with_operator(bpy.ops.import_scene.gltf),
+        '.glb': import_with_operator(bpy.ops.import_scene.gltf),
+    }
 
     @staticmethod
     def load(path: str, scene_dimension: int, normalize: bool) -> tuple:
@@ -220,11 +371,12 @@ class ObjectIO:
         """
         assert os.path.exists(path), "Not such file or directory!"
         _, extension = os.path.splitext(path)
-        assert extension in ObjectIO.extensions_allowed, f"No extension allowed. Only {ObjectIO.extensions_allowed} are " \
-                                                       f"supported for now. "
+        extension = extension.lower()
+        assert extension in ObjectIO.extensions_allowed, f"No extension allowed. Only {list(ObjectIO.extensions_allowed)} " \
+                                                       f"are supported for now. "
         
-        ObjectIO.extensions_allowed.get(extension)(filepath=path, use_smooth_groups=True)
-        obj = bpy.context.selected_objects[0]
+        obj = ObjectIO.extensions_allowed.get(extension)(path)
+        obj.select_set(True)
         obj.name = f"{UtilsName.model_name}-{os.path.basename(path)}"
         obj.data.transform(obj.matrix_world)
         obj.matrix_world = Matrix()
@@ -236,26 +388,131 @@ class ObjectIO:
         return obj
 
     @staticmethod
-    def export(path: str):
-        bpy.ops.object.select_all(action='DESELECT')
-        for ob in bpy.data.objects:
-            if UtilsName.model_name in ob.name:
-                ob.select_set(True)
+    def to_arrays(obj) -> tuple:
+        """
+        Get the object mesh as numpy buffers with foreach_get, in world coordinates.
+        @param: obj : the object.
+        @return: vertices, polygon indices and polygon sizes.
+        """
+        mesh = obj.data
+
+        vertices = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+        mesh.vertices.foreach_get("co", vertices)
+        vertices = vertices.reshape(-1, 3)
+
+        matrix = np.array(obj.matrix_world, dtype=np.float32)
+        vertices = vertices @ matrix[:3, :3].T + matrix[:3, 3]
+
+        indices = np.empty(len(mesh.loops), dtype=np.int32)
+        mesh.loops.foreach_get("vertex_index", indices)
+
+        sizes = np.empty(len(mesh.polygons), dtype=np.int32)
+        mesh.polygons.foreach_get("loop_total", sizes)
+
+        return vertices, indices, sizes
+
+    @staticmethod
+    def export(path: str, obj):
+        """
+        Write the object mesh without the export operators. The format is
+        taken from the path extension: obj, ply (binary) or npz.
+        @param: path : output path.
+        @param: obj : the object.
+        """
+        MeshWriter.write(path, *ObjectIO.to_arrays(obj))
+
+def get_rss() -> int:
+    """
+    Resident set size of the current process in bytes. Falls back to the peak
+    size where the current one is not available, and to 0 on Windows.
+    """
+    try:
+        with open("/proc/self/statm") as fr:
+            return int(fr.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+
+    if resource is None:
+        return 0
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # darwin reports bytes, linux KiB
 
-        bpy.ops.export_scene.obj(filepath=path, use_materials=False)
 
 class Cleaner:
+    # Datablock types created by the generator.
+    DATABLOCKS = ('meshes', 'materials', 'images', 'lights', 'cameras', 'worlds', 'textures', 'node_groups',
+                  'actions')
+    # Datablocks that existed before the generator started, None until then.
+    foreign: Optional[set] = None
+
+    @staticmethod
+    def key(block) -> tuple:
+        return block.as_pointer(), block.name
+
+    @staticmethod
+    def track():
+        """
+        Record the existing datablocks, so they are never purged.
+        """
+        Cleaner.foreign = {
+            Cleaner.key(block)
+            for collection in (getattr(bpy.data, name) for name in Cleaner.DATABLOCKS)
+            for block in collection
+        }
+
     @staticmethod
-    def clear_scene():
+    def clear_scene(keep: List = ()):
+        """
+        Remove the objects.
+        @param: keep : objects to keep.
+        """
         objs = bpy.data.objects
-        for obj in objs:
+        for obj in [o for o in objs if o not in keep]:
             print(f"Deleted object: type={obj.type}, name={obj.name}")
             objs.remove(obj, do_unlink=True)
 
+    @staticmethod
+    def purge_orphans() -> int:
+        """
+        Remove the datablocks without users created since track. Removing a
+        datablock can leave its dependencies orphan (material -> images), so
+        this repeats until nothing else is removed. Datablocks with fake user
+        are kept, and so is everything when nothing was tracked.
+        @return: amount of datablocks removed.
+        """
+        if Cleaner.foreign is None:
+            return 0
+
+        removed = 0
+        while True:
+            orphans = [
+                (collection, block)
+                for collection in (getattr(bpy.data, name) for name in Cleaner.DATABLOCKS)
+                for block in collection if block.users == 0 and Cleaner.key(block) not in Cleaner.foreign
+            ]
+            if not orphans:
+                return removed
+
+            for collection, block in orphans:
+                collection.remove(block)
+            removed += len(orphans)
+
+    @staticmethod
+    def datablock_counts() -> Dict[str, int]:
+        """
+        Amount of datablocks of each type handled by the generator.
+        """
+        counts = {name: len(getattr(bpy.data, name)) for name in Cleaner.DATABLOCKS}
+        counts['objects'] = len(bpy.data.objects)
+        return counts
+
 class RenderHandler:
     IMG_FORMAT = 'PNG'
     ENGINE_CYCLES = 'CYCLES'
     ENGINE_EEVEE = 'BLENDER_EEVEE'
+    # Pixels around the meshes region, for the antialiasing.
+    BORDER_MARGIN = 4
 
     @staticmethod
     def set_render_output_resolution(res_x: int, res_y: int, res_percentage: int = 100) -> None:
@@ -288,13 +545,206 @@ class RenderHandler:
         bpy.context.scene.cycles.device = 'GPU'
 
     @staticmethod
-    def render(path: str, engine: str, samples: int):
-        bpy.context.scene.render.filepath = path
+    def render(path: str, engine: str, samples: int, frames: tuple = None):
+        """
+        Render a still image, or an animation with a single call.
+        @param path: output path, the frame number is appended for animations.
+        @param frames: (first, last) frames of the animation, None for a still image.
+        """
+        scene = bpy.context.scene
+        scene.render.filepath = path
         if engine == RenderHandler.ENGINE_CYCLES:
             RenderHandler.set_cycles(transparent=True, samples=samples)
         else:
-            bpy.context.scene.render.engine = RenderHandler.ENGINE_EEVEE
-        bpy.ops.render.render(use_viewport=True, write_still=True)
+            scene.render.engine = RenderHandler.ENGINE_EEVEE
+
+        if frames is None:
+            bpy.ops.render.render(use_viewport=True, write_still=True)
+            return
+
+        scene.render.image_settings.file_format = RenderHandler.IMG_FORMAT
+        # The animation render moves the current frame, the scene is given back as it was.
+        range_and_current = scene.frame_start, scene.frame_end, scene.frame_current
+        scene.frame_start, scene.frame_end = frames
+        try:
+            bpy.ops.render.render(animation=True, use_viewport=True)
+        finally:
+            scene.frame_start, scene.frame_end, _ = range_and_current
+            scene.frame_set(range_and_current[2])
+
+    @staticmethod
+    def object_border(margin: int = BORDER_MARGIN) -> Optional[tuple]:
+        """
+        Region of the frame covered by the rendered meshes, from their bounding
+        boxes seen by the scene camera.
+        @param margin: pixels added around the region.
+        @return: (min_x, max_x, min_y, max_y) normalized, None if a mesh is
+        behind the camera.
+        """
+        scene = bpy.context.scene
+        camera = scene.camera
+        # The camera tracks an empty, its matrix is updated by the depsgraph.
+        bpy.context.view_layer.update()
+
+        corners = [
+            obj.matrix_world @ Vector(corner)
+            for obj in scene.objects if obj.type == 'MESH' and not obj.hide_render
+            for corner in obj.bound_box
+        ]
+        if not corners:
+            return None
+        view = np.array([tuple(world_to_camera_view(scene, camera, corner)) for corner in corners])
+        if (view[:, 2] <= camera.data.clip_start).any():
+            return None
+
+        margin_x = margin / scene.render.resolution_x
+        margin_y = margin / scene.render.resolution_y
+        min_x, min_y = np.clip(view[:, :2].min(axis=0) - (margin_x, margin_y), 0, 1)
+        max_x, max_y = np.clip(view[:, :2].max(axis=0) + (margin_x, margin_y), 0, 1)
+        if min_x >= max_x or min_y >= max_y:
+            return None
+        return float(min_x), float(max_x), float(min_y), float(max_y)
+
+    @staticmethod
+    @contextmanager
+    def standard_colors():
+        """
+        Render with the Standard view transform and no look, so emission
+        colors reach the image only through the sRGB curve.
+        """
+        view = bpy.context.scene.view_settings
+        settings = view.view_transform, view.look, view.exposure, view.gamma
+        view.view_transform, view.look, view.exposure, view.gamma = 'Standard', 'None', 0, 1
+        try:
+            yield
+        finally:
+            view.view_transform, view.look, view.exposure, view.gamma = settings
+
+    @staticmethod
+    @contextmanager
+    def border(region: Optional[tuple]):
+        """
+        Render only a region of the frame. The image keeps the full size, the
+        rest of the frame is left transparent. The background is transparent
+        with the whole frame as well, so every mask looks the same.
+        @param region: (min_x, max_x, min_y, max_y) normalized, None renders the whole frame.
+        """
+        render = bpy.context.scene.render
+        settings = (render.use_border, render.use_crop_to_border, render.film_transparent,
+                    render.border_min_x, render.border_max_x, render.border_min_y, render.border_max_y)
+        render.use_border, render.use_crop_to_border, render.film_transparent = region is not None, False, True
+        if region is not None:
+            render.border_min_x, render.border_max_x, render.border_min_y, render.border_max_y = region
+        try:
+            yield
+        finally:
+            (render.use_border, render.use_crop_to_border, render.film_transparent,
+             render.border_min_x, render.border_max_x, render.border_min_y, render.border_max_y) = settings
+
+    @staticmethod
+    def frame_paths(frames: tuple) -> List[str]:
+        """
+        Paths of the images of the last animation rendered.
+        @param frames: (first, last) frames.
+        """
+        scene = bpy.context.scene
+        return [scene.render.frame_path(frame=frame) for frame in range(frames[0], frames[1] + 1)]
+
+
+class WorldRegistry:
+    """
+    Worlds built once per process and switched by reference, plus a pool of
+    preloaded HDRIs for the environment lighting. Everything is kept with a
+    fake user, so purges between objects do not remove it.
+    """
+    DEFAULT_HDRI = "//assets/HDRIsunBeach.exr"
+
+    worlds = {}
+    hdris = {}
+    # HDRI of the next renders, None for the first one of the pool.
+    current: Optional[str] = None
+
+    @staticmethod
+    def _alive(block) -> bool:
+        try:
+            return block is not None and block.name is not None
+        except ReferenceError:  # removed from bpy.data
+            return False
+
+    @staticmethod
+    def switch(name: str, build: callable):
+        """
+        Set a world as the scene one, building it only the first time.
+        @param name: world name
+        @param build: function that fills a new world.
+        @return: the world
+        """
+        world = WorldRegistry.worlds.get(name)
+        if not WorldRegistry._alive(world):
+            world = bpy.data.worlds.get(name)
+            if world is None:
+                world = bpy.data.worlds.new(name)
+                world.use_nodes = True
+                # Keep it while the other world is active so it is not purged.
+                world.use_fake_user = True
+                build(world)
+            WorldRegistry.worlds[name] = world
+
+        scene = bpy.context.scene
+        if scene.world != world:
+            scene.world = world
+        return world
+
+    @staticmethod
+    def hdri(path: str = DEFAULT_HDRI):
+        """
+        Preloaded HDRI image, loaded only the first time.
+        @param path: image path
+        """
+        image = WorldRegistry.hdris.get(path)
+        if not WorldRegistry._alive(image):
+            image = bpy.data.images.load(path, check_existing=True)
+            image.use_fake_user = True
+            WorldRegistry.hdris[path] = image
+        return image
+
+    @staticmethod
+    def preload_hdris(paths: List[str]):
+        """
+        Load the HDRIs for random environment lighting, the pool is replaced.
+        @param paths: images paths, the default HDRI is used if it's empty.
+        """
+        for path in list(WorldRegistry.hdris):
+            if path not in paths:
+                # Without the fake user the next purge removes it.
+                image = WorldRegistry.hdris.pop(path)
+                if WorldRegistry._alive(image):
+                    image.use_fake_user = False
+        for path in paths:
+            WorldRegistry.hdri(path)
+
+    @staticmethod
+    def use_hdri(path: Optional[str] = None):
+        """
+        Choose the HDRI of the next global illumination renders.
+        @param path: image path, None for the first one of the pool.
+        """
+        WorldRegistry.current = path
+
+    @staticmethod
+    def apply_hdri():
+        """
+        Set the chosen HDRI as the global illumination environment, only the
+        image of the node changes.
+        """
+        if WorldRegistry.current is None and not WorldRegistry.hdris:
+            return
+        world = LightEffect.global_illumination()
+        image = WorldRegistry.hdri(WorldRegistry.current) if WorldRegistry.current is not None \
+            else next(iter(WorldRegistry.hdris.values()))
+        node = world.node_tree.nodes.get("Environment Texture")
+        if node is not None and node.image != image:
+            node.image = image
 
 
 class LightEffect:
@@ -302,48 +752,42 @@ class LightEffect:
     This class creates a global illumination
     and change rendering parameters to preview the 3D model
     """
+    WORLD_NAME = "gentool3dmultiview"
 
     @staticmethod
     def global_illumination():
         """
         This function creates a global lighting "world" and assigns it as the main one,
         among its capabilities adds an hdri image as global illumination.
-        Configures "cycles" as the main engine,10 samples and transparent background
-        If the world and the configuration exists, it does not recreate it
+        If the world exists, it does not recreate it
+        @return: the world
         """
-        pass
-        scene = bpy.context.scene
-        if scene.world.name != "gentool3dmultiview":
-            # path a ti hdri
-            path_hdri = "//assets/HDRIsunBeach.exr"
-            new_world = bpy.data.worlds.new("gentool3dmultiview")
-            new_world.use_nodes = True
-            scene.world = new_world
-            shader_node_tex_environment = scene.world.node_tree.nodes.new("ShaderNodeTexEnvironment")
-            shader_node_tex_environment.image = bpy.data.images.load(path_hdri)
-            node_tree = scene.world.node_tree
+        def build(world):
+            shader_node_tex_environment = world.node_tree.nodes.new("ShaderNodeTexEnvironment")
+            # The first HDRI of the pool, or the default one.
+            shader_node_tex_environment.image = next(iter(WorldRegistry.hdris.values()), None) \
+                or WorldRegistry.hdri()
+            node_tree = world.node_tree
             node_tree.links.new(
                 shader_node_tex_environment.outputs['Color'], node_tree.nodes['Background'].inputs['Color']
             )
-            scene.world.node_tree.nodes["Background"].inputs[1].default_value = 2
+            node_tree.nodes["Background"].inputs[1].default_value = 2
+
+        return WorldRegistry.switch(LightEffect.WORLD_NAME, build)
 
     @staticmethod
     def create_shadeless_world(name="MundoTransparente", color=(0, 0, 0, 1)):
         """
-        This function creates a global lighting "world" and assigns it as the main one,
-        among its capabilities adds an hdri image as global illumination.
-        Configures "cycles" as the main engine,10 samples and transparent background
-        If the world and the configuration exists, it does not recreate it
+        This function creates a plain color "world" and assigns it as the main one.
+        If the world exists, it does not recreate it
         @param color: background color
         @param name: world name
+        @return: the world
         """
-        scene = bpy.context.scene
-        if scene.world.name != name:
-            new_world = bpy.data.worlds.new(name)
-            new_world.use_nodes = True
-            scene.world = new_world
-            node_tree = scene.world.node_tree
-            node_tree.nodes["Background"].inputs[0].default_value = color  # background color
+        def build(world):
+            world.node_tree.nodes["Background"].inputs[0].default_value = color  # background color
+
+        return WorldRegistry.switch(name, build)
 
 
 class MaterialHandler:
@@ -351,6 +795,17 @@ class MaterialHandler:
     This class handles the materials.
     """
     TRASNPARENT = "transparent"
+    INSTANCE = "instance_segmentation"
+
+    # Nodes added to the library materials for the variants.
+    HUE_NODE = "gentool-hue"
+    MAPPING_NODE = "gentool-mapping"
+    COORDINATES_NODE = "gentool-coordinates"
+
+    # Principled BSDF inputs of the variants: metallic, specular and roughness.
+    VARIANT_INPUTS = (4, 5, 7)
+    # Values of those inputs in the library, by material name.
+    LIBRARY_VALUES: Dict[str, List[float]] = {}
 
     SHADE = 'shadeless'
     SILHOUETTE = 'silhouette'
@@ -417,6 +872,24 @@ class MaterialHandler:
             data_to.materials = [material_name]
             return data_to.materials  # this could be empty
 
+    @staticmethod
+    def preload_materials(path="//assets/materiales.blend"):
+        """
+        Loads all the library materials in a single pass over the ".blend" file.
+        @param path materials location file
+        """
+        missing = [name for name in MaterialHandler.MATERIALS.values() if bpy.data.materials.get(name) is None]
+        if not missing:
+            return
+
+        with bpy.data.libraries.load(path) as (data_from, data_to):
+            data_to.materials = [name for name in missing if name in data_from.materials]
+
+        for i in data_to.materials:
+            if i is not None:
+                # Library materials are reused by every object, keep them on purges.
+                i.use_fake_user = True
+
     @staticmethod
     def _create_material(material_name, model, apply_light):  # metodo privado por convención
         """
@@ -435,6 +908,8 @@ class MaterialHandler:
         materials = MaterialHandler.load_material(material_name=material_name)
 
         for i in materials:
+            # Library materials are reused by every object, keep them on purges.
+            i.use_fake_user = True
             model.active_material = i
 
         apply_light()
@@ -450,13 +925,129 @@ class MaterialHandler:
         )
 
     @staticmethod
-    def modify_material_properties(model, metalic, specular, roughness):
+    def modify_material_properties(model, metalic=None, specular=None, roughness=None, hue=None, scale=None):
         """
         Accens to the "Principled bsdf" of the model an change his params.
+        Only the inputs of the shared material change, so no datablock is
+        duplicated. None or NaN values go back to the library values, which
+        are kept the first time a material is modified.
         """
-        model.active_material.node_tree.nodes["Principled BSDF"].inputs[4].default_value = metalic
-        model.active_material.node_tree.nodes["Principled BSDF"].inputs[5].default_value = specular
-        model.active_material.node_tree.nodes["Principled BSDF"].inputs[7].default_value = roughness
+        MaterialHandler.set_variant(model.active_material, metalic, specular, roughness, hue, scale)
+
+    @staticmethod
+    def set_variant(material, metalic=None, specular=None, roughness=None, hue=None, scale=None):
+        node_tree = material.node_tree
+        bsdf = node_tree.nodes.get("Principled BSDF")
+        if bsdf is None:
+            return
+
+        defaults = MaterialHandler.LIBRARY_VALUES.setdefault(
+            material.name, [bsdf.inputs[index].default_value for index in MaterialHandler.VARIANT_INPUTS]
+        )
+        for index, default, value in zip(MaterialHandler.VARIANT_INPUTS, defaults, (metalic, specular, roughness)):
+            bsdf.inputs[index].default_value = value if value is not None and value == value else default  # NaN != NaN
+
+        MaterialHandler.set_hue(node_tree, bsdf, hue)
+        MaterialHandler.set_texture_scale(node_tree, scale)
+
+    @staticmethod
+    def reset_variants():
+        """
+        Give the modified library materials back their own values, so the
+        variants of an object do not leak to the next one.
+        """
+        for name in MaterialHandler.LIBRARY_VALUES:
+            material = bpy.data.materials.get(name)
+            if material is not None:
+                MaterialHandler.set_variant(material)
+
+    @staticmethod
+    def set_hue(node_tree, bsdf, hue=None):
+        """
+        Shift the base color hue with a Hue/Saturation node, added the first
+        time a hue is set, so later variants only change an input value.
+        @param hue: node hue, 0.5 keeps the color. None or NaN resets it.
+        """
+        node = node_tree.nodes.get(MaterialHandler.HUE_NODE)
+        if node is None:
+            if hue is None or hue != hue:
+                return
+            node = node_tree.nodes.new("ShaderNodeHueSaturation")
+            node.name = MaterialHandler.HUE_NODE
+            base_color = bsdf.inputs['Base Color']
+            if base_color.is_linked:
+                node_tree.links.new(base_color.links[0].from_socket, node.inputs['Color'])
+            else:
+                node.inputs['Color'].default_value = base_color.default_value
+            node_tree.links.new(node.outputs['Color'], base_color)
+
+        node.inputs['Hue'].default_value = 0.5 if hue is None or hue != hue else hue
+
+    @staticmethod
+    def set_texture_scale(node_tree, scale=None):
+        """
+        Scale the coordinates of the image and procedural textures with a
+        Mapping node per texture, added the first time a scale is set.
+        @param scale: coordinates scale, None or NaN resets it to 1.
+        """
+        value = 1 if scale is None or scale != scale else scale
+        for texture in [n for n in node_tree.nodes if n.type.startswith('TEX_') and 'Vector' in n.inputs]:
+            name = f"{MaterialHandler.MAPPING_NODE}-{texture.name}"
+            mapping = node_tree.nodes.get(name)
+            if mapping is None:
+                if value == 1:
+                    continue
+                mapping = node_tree.nodes.new("ShaderNodeMapping")
+                mapping.name = name
+                vector = texture.inputs['Vector']
+                if vector.is_linked:
+                    source = vector.links[0].from_socket
+                else:
+                    # The same coordinates Blender uses for an unlinked texture.
+                    coordinates = node_tree.nodes.get(MaterialHandler.COORDINATES_NODE)
+                    if coordinates is None:
+                        coordinates = node_tree.nodes.new("ShaderNodeTexCoord")
+                        coordinates.name = MaterialHandler.COORDINATES_NODE
+                    source = coordinates.outputs['UV' if texture.type == 'TEX_IMAGE' else 'Generated']
+                node_tree.links.new(source, mapping.inputs['Vector'])
+                node_tree.links.new(mapping.outputs['Vector'], vector)
+
+            if 'Scale' in mapping.inputs:
+                mapping.inputs['Scale'].default_value = (value, value, value)
+            else:  # Blender 2.80 has the transform as node properties.
+                mapping.scale = (value, value, value)
+
+    @staticmethod
+    def instance_segmentation_material():
+        """
+        Emission material colored by the object color, so linked duplicates
+        sharing the mesh and the material still get different colors.
+        """
+        mat = bpy.data.materials.get(MaterialHandler.INSTANCE)
+        if mat is None:
+            mat = bpy.data.materials.new(MaterialHandler.INSTANCE)
+            mat.use_nodes = True
+            mat.use_fake_user = True
+            node_tree = mat.node_tree
+            node_tree.nodes.clear()
+            info = node_tree.nodes.new("ShaderNodeObjectInfo")
+            emission = node_tree.nodes.new("ShaderNodeEmission")
+            output = node_tree.nodes.new("ShaderNodeOutputMaterial")
+            node_tree.links.new(info.outputs['Color'], emission.inputs['Color'])
+            node_tree.links.new(emission.outputs['Emission'], output.inputs['Surface'])
+        return mat
+
+    @staticmethod
+    def share_material(model, targets):
+        """
+        Set the active material of a model to other models.
+        @param model the model
+        @param targets models to change.
+        """
+        for target in targets:
+            target.data.materials.clear()
+            if model.active_material is not None:
+                target.data.materials.append(model.active_material)
 
     @staticmethod
     def clear_material(model):
@@ -465,15 +1056,41 @@ class MaterialHandler:
         model.data.materials.clear()
 
 
-def create_random_3_tuple(min_value, max_value):
-    return (
-        random.uniform(min_value, max_value),
-        random.uniform(min_value, max_value),
-        random.uniform(min_value, max_value)
+def create_random_3_tuple(min_value, max_value, rng: Optional[np.random.RandomState] = None):
+    return tuple((rng or np.random).uniform(min_value, max_value, 3).tolist())
+
+def sphere_viewpoints(v: Viewpoint):
+    """
+    Generator of the vertices of a UV sphere viewpoint. The sphere is only
+    created when the first pose is requested.
+    @param: v : OBJECT_PATH viewpoint.
+    """
+    # Create the blender UV_sphere.
+    viewpoint_object = ViewpointsCreator.create_viewpoints(
+        u_segments=v.horizontal_divisions,
+        v_segments=v.vertical_divisions,
+        diameter=v.size
     )
+    # Get vertices as locations.
+    mesh = viewpoint_object.data
+    locations = np.empty(len(mesh.vertices) * 3, dtype=np.float64)
+    mesh.vertices.foreach_get("co", locations)
+
+    # Remove it for memory saving
+    bpy.data.objects.remove(viewpoint_object, do_unlink=True)
+    bpy.data.meshes.remove(mesh)
+
+    for location in locations.reshape(-1, 3).tolist():
+        yield tuple(location)
+
 
 class DataGenApplyFuncts(DataGenFunctsInterface):
 
+    def __init__(self):
+        # Other models of the current clutter scene, they take the materials
+        # of the loaded object.
+        self.companions = []
+
     def set_render_resolution(self, r: Render):
         RenderHandler.set_render_output_resolution(
             res_x=r.resolution_x,
@@ -481,15 +1098,48 @@ class DataGenApplyFuncts(DataGenFunctsInterface):
             res_percentage=100
         )
 
-    def render(self, path: str, render_style: str, texture: str, object_loaded):
-        
+    def render(self, path: str, render_style: str, texture: str, object_loaded, material_params: tuple = None,
+               frames: tuple = None):
+        outputs = self._render([(None, path)], render_style, texture, object_loaded, material_params, frames)
+        if outputs is None:
+            return None
+        return outputs if frames else outputs[0]
+
+    def render_views(self, paths: List[str], render_style: str, texture: str, object_loaded, cameras: List,
+                     material_params: tuple = None):
+        outputs = self._render(list(zip(cameras, paths)), render_style, texture, object_loaded, material_params)
+        bpy.context.scene.camera = cameras[0]
+        return outputs
+
+    def _render(self, views: List[tuple], render_style: str, texture: str, object_loaded,
+                material_params: tuple = None, frames: tuple = None):
+        """
+        Set up a style and render it from each view, a (camera, folder) pair.
+        A None camera keeps the scene one.
+        """
+        # An animation is saved as path/<style>_<frame>, a still image as path/<style>.PNG
+        outputs = [
+            os.path.join(path, f"{render_style}_" if frames else f"{render_style}.{RenderHandler.IMG_FORMAT}")
+            for _, path in views
+        ]
+
+        def shoot(engine: str, samples: int, border: bool = False):
+            # Only the active camera changes between the views, the rest of the scene is not updated.
+            for (camera, _), output in zip(views, outputs):
+                if camera is not None:
+                    bpy.context.scene.camera = camera
+                # Masks of animations use the whole frame, the meshes move between frames.
+                mask = RenderHandler.border(RenderHandler.object_border() if not frames else None) if border \
+                    else nullcontext()
+                with mask:
+                    RenderHandler.render(path=output, engine=engine, samples=samples, frames=frames)
+
         if render_style == Render.Style.NORMAL:
             MaterialHandler.clear_material(object_loaded)
-            RenderHandler.render(
-                path=os.path.join(path, f"{Render.Style.NORMAL}.{RenderHandler.IMG_FORMAT}"),
-                engine=RenderHandler.ENGINE_EEVEE,
-                samples=100
-            )
+            WorldRegistry.apply_hdri()
+            self.share_materials(object_loaded)
+
+            shoot(RenderHandler.ENGINE_EEVEE, Render.SAMPLES[Render.Style.NORMAL])
 
         elif render_style == Render.Style.SILHOUETTE:
             MaterialHandler.apply_material_to(
@@ -501,11 +1151,9 @@ class DataGenApplyFuncts(DataGenFunctsInterface):
                 object_loaded,
                 color=MaterialHandler.COLORS_SHADELESS.get(MaterialHandler.SILHOUETTE)
             )
-            RenderHandler.render(
-                os.path.join(path, f"{Render.Style.SILHOUETTE}.{RenderHandler.IMG_FORMAT}"),
-                engine=RenderHandler.ENGINE_EEVEE,
-                samples=100
-            )
+            self.share_materials(object_loaded)
+
+            shoot(RenderHandler.ENGINE_EEVEE, Render.SAMPLES[Render.Style.SILHOUETTE], border=True)
 
         elif render_style == Render.Style.TEXTURE_SEGMENTATION:
             MaterialHandler.apply_material_to(
@@ -517,11 +1165,9 @@ class DataGenApplyFuncts(DataGenFunctsInterface):
                 object_loaded,
                 color=MaterialHandler.COLORS_SHADELESS.get(f"{texture}_{MaterialHandler.SHADE}")
             )
-            RenderHandler.render(
-                os.path.join(path, f"{Render.Style.TEXTURE_SEGMENTATION}.{RenderHandler.IMG_FORMAT}"),
-                engine=RenderHandler.ENGINE_EEVEE,
-                samples=100
-            )
+            self.share_materials(object_loaded)
+
+            shoot(RenderHandler.ENGINE_EEVEE, Render.SAMPLES[Render.Style.TEXTURE_SEGMENTATION], border=True)
 
         elif render_style == Render.Style.RAY_TRACED:
             MaterialHandler.apply_material_to(
@@ -529,17 +1175,11 @@ class DataGenApplyFuncts(DataGenFunctsInterface):
                 material=texture,
                 apply_light=LightEffect.global_illumination
             )
-            # MaterialHandler.modify_material_properties(
-            #     model=object_loaded,
-            #     metalic=o.material.metallic,
-            #     specular=o.material.specular,
-            #     roughness=o.material.roughness
-            # )
-            RenderHandler.render(
-                os.path.join(path, f"{Render.Style.RAY_TRACED}.{RenderHandler.IMG_FORMAT}"),
-                engine=RenderHandler.ENGINE_CYCLES,
-                samples=128
-            ) 
+            WorldRegistry.apply_hdri()
+            MaterialHandler.modify_material_properties(object_loaded, *(material_params or ()))
+            self.share_materials(object_loaded)
+
+            shoot(RenderHandler.ENGINE_CYCLES, Render.SAMPLES[Render.Style.RAY_TRACED])
 
         elif render_style == Render.Style.RASTERED:
             MaterialHandler.apply_material_to(
@@ -547,21 +1187,45 @@ class DataGenApplyFuncts(DataGenFunctsInterface):
                 material=texture,
                 apply_light=LightEffect.global_illumination
             )
-            RenderHandler.render(
-                os.path.join(path, f"{Render.Style.RASTERED}.{RenderHandler.IMG_FORMAT}"),
-                engine=RenderHandler.ENGINE_EEVEE,
-                samples=100
-            )
+            WorldRegistry.apply_hdri()
+            MaterialHandler.modify_material_properties(object_loaded, *(material_params or ()))
+            self.share_materials(object_loaded)
+
+            shoot(RenderHandler.ENGINE_EEVEE, Render.SAMPLES[Render.Style.RASTERED])
+
+        elif render_style == Render.Style.INSTANCE_SEGMENTATION:
+            object_loaded.active_material = MaterialHandler.instance_segmentation_material()
+            LightEffect.create_shadeless_world()
+            self.share_materials(object_loaded)
+            # Filmic would change the colors listed in instances.csv.
+            with RenderHandler.standard_colors():
+                shoot(RenderHandler.ENGINE_EEVEE, Render.SAMPLES[Render.Style.INSTANCE_SEGMENTATION], border=True)
 
         else:
-            pass
+            return None
 
         MaterialHandler.clear_material(object_loaded)
+        self.share_materials(object_loaded)
+        return RenderHandler.frame_paths(frames) if frames else outputs
 
+    def render_frames(self, paths: List[str], render_style: str, texture: str, object_loaded,
+                      material_params: tuple = None, first_frame: int = 1):
+        frames = (first_frame, first_frame + len(paths) - 1)
+        outputs = self.render(paths[0], render_style, texture, object_loaded, material_params, frames=frames)
+        if outputs is None:
+            return None
 
-    def define_texture(self, o: Object):
+        # Map the frames back to the <index>/<style>.PNG layout.
+        images = [os.path.join(path, f"{render_style}.{RenderHandler.IMG_FORMAT}") for path in paths]
+        for output, image in zip(outputs, images):
+            os.replace(output, image)
+        return images
+
+
+    def define_texture(self, o: Object, rng: Optional[np.random.RandomState] = None):
         if o.material.texture == Material.Texture.RANDOM:
-            return random.sample(MaterialHandler.TEXTURES.keys(), 1)[0]
+            textures = list(MaterialHandler.TEXTURES)
+            return textures[(rng or np.random).randint(len(textures))]
         return o.material.texture
 
     def create_environment(self, e: Environment):
@@ -570,57 +1234,51 @@ class DataGenApplyFuncts(DataGenFunctsInterface):
         )
         return env
 
-    def create_viewpoints(self, vs: List[Viewpoint], preview: bool):
+    def create_viewpoints(self, vs: List[Viewpoint], preview: bool, rng: Optional[np.random.RandomState] = None):
         viewpoints_created = list()
 
         for v in vs:
             if v.kind == Viewpoint.Kind.STATIC_CAMERA:
                 location = tuple(v.location)  # create an inmutable object.
-                viewpoints_created.append([location] * v.amount)  # repeate it for memory saving
+                viewpoints_created.append(itertools.repeat(location, v.amount))  # repeate it for memory saving
 
-            elif v.kind == Viewpoint.Kind.DYNAMIC_CAMERA:
-                viewpoints_created.append([  # append randoms 3-tuples.
-                    create_random_3_tuple(0 - v.max_range, v.max_range) for _ in range(v.amount)
-                ])
-
-            elif v.kind == Viewpoint.Kind.OBJECT_PATH:
-                # Create the blender UV_sphere.
-                viewpoint_object = ViewpointsCreator.create_viewpoints(
-                    u_segments=v.horizontal_divisions,
-                    v_segments=v.vertical_divisions,
-                    diameter=v.size
-                )
-                # Get vertices as locations.
+            elif v.kind in (Viewpoint.Kind.DYNAMIC_CAMERA, Viewpoint.Kind.CAMERA_RIG):
+                # randoms 3-tuples, created on demand. The planner expands the rigs cameras.
                 viewpoints_created.append(
-                    [(vert.co.x, vert.co.y, vert.co.z) for vert in viewpoint_object.data.vertices]
+                    create_random_3_tuple(0 - v.max_range, v.max_range, rng) for _ in range(v.amount)
                 )
-                # Remove it for memory saving
-                bpy.data.objects.remove(viewpoint_object, do_unlink=True)
+
+            elif v.kind == Viewpoint.Kind.OBJECT_PATH:
+                viewpoints_created.append(sphere_viewpoints(v))
             else:
-                continue
+                # Keeps the iterators aligned with the config viewpoints.
+                viewpoints_created.append(iter(()))
 
-        return viewpoints_created if not preview else [[viewpoints_created[0][0], ], ]
+        return viewpoints_created if not preview else [[next(itertools.chain.from_iterable(viewpoints_created))], ]
 
-    def create_light(self, li: Light):
+    def create_light(self, li: Light, rng: Optional[np.random.RandomState] = None):
         if li.kind == Light.Kind.STATIC_LIGHT:
             return LightCreator.create_light(kind='POINT', color=tuple(li.color),
                 location=tuple(li.location), energy=li.max_energy)
 
         if li.kind == Light.Kind.DYNAMIC_LIGHT:
             return LightCreator.create_light(kind='POINT', color=tuple(li.color),
-                                        location=create_random_3_tuple(0 - li.max_range, li.max_range),
-                                        energy=random.uniform(0, li.max_energy))
+                                        location=create_random_3_tuple(0 - li.max_range, li.max_range, rng),
+                                        energy=float((rng or np.random).uniform(0, li.max_energy)))
 
         if li.kind == Light.Kind.RAINBOW_STATIC_LIGHT:
-            return LightCreator.create_light(kind='POINT', color=create_random_3_tuple(0, 1),
-                                        location=create_random_3_tuple(0 - li.max_range, li.max_range),
+            return LightCreator.create_light(kind='POINT', color=create_random_3_tuple(0, 1, rng),
+                                        location=tuple(li.location),
                                         energy=li.max_energy)
 
         if li.kind == Light.Kind.RAINBOW_DYNAMIC_LIGHT:
-            return LightCreator.create_light(kind='POINT', color=create_random_3_tuple(0, 1),
-                                        location=create_random_3_tuple(0 - li.max_range, li.max_range),
-                                        energy=random.uniform(0, li.max_energy))
+            return LightCreator.create_light(kind='POINT', color=create_random_3_tuple(0, 1, rng),
+                                        location=create_random_3_tuple(0 - li.max_range, li.max_range, rng),
+                                        energy=float((rng or np.random).uniform(0, li.max_energy)))
     
+    def create_light_from_params(self, color: tuple, location: tuple, energy: float):
+        return LightCreator.create_light(kind='POINT', color=color, location=location, energy=energy)
+
     def get_light_params(self, light):
         return [*light.location.xyz, light.data.energy]
 
@@ -640,16 +1298,124 @@ class DataGenApplyFuncts(DataGenFunctsInterface):
     def move_camara_to(self, camera, coords):
         camera.location.xyz = coords
 
+    def create_rig(self, camera, amount: int) -> List:
+        cameras = [camera]
+        for _ in range(amount - 1):
+            rig_camera = camera.copy()  # same camera data and track constraint.
+            camera.users_collection[0].objects.link(rig_camera)
+            cameras.append(rig_camera)
+        return cameras
+
+    def remove_rig(self, cameras: List):
+        bpy.context.scene.camera = cameras[0]
+        for rig_camera in cameras[1:]:
+            bpy.data.objects.remove(rig_camera, do_unlink=True)
+
     def clear_lights(self):
         for li in bpy.data.objects:
             if li.type == 'LIGHT':
+                light_data = li.data
                 bpy.data.objects.remove(li, do_unlink=True)
+                if light_data.users == 0:
+                    bpy.data.lights.remove(light_data)
               
-    def export_normalized_object(self, path):
-        ObjectIO.export(path=path)
-
-    def clear_objects(self):
-        Cleaner.clear_scene()
+    def export_normalized_object(self, path, object_loaded):
+        ObjectIO.export(path=path, obj=object_loaded)
+
+    def clear_objects(self, keep: List = ()):
+        Cleaner.clear_scene(keep)
+        # A removed rig camera could have been the scene camera.
+        cameras = [o for o in keep if o.type == 'CAMERA']
+        if bpy.context.scene.camera is None and cameras:
+            bpy.context.scene.camera = cameras[0]
+        MaterialHandler.reset_variants()
+        self.companions = []
+
+    def track_datablocks(self):
+        Cleaner.track()
+
+    def purge_orphans(self):
+        return Cleaner.purge_orphans()
+
+    def memory_usage(self):
+        return {'rss': get_rss(), **Cleaner.datablock_counts()}
+
+    def share_materials(self, object_loaded):
+        MaterialHandler.share_material(object_loaded, self.companions)
+
+    def create_instances(self, sources: List, amount: int) -> List:
+        object_loaded, *self.companions = sources
+        object_loaded.color = instance_color(0)
+
+        instances = []
+        for i in range(amount):
+            source = sources[i % len(sources)]
+            instance = source.copy()  # linked duplicate, the mesh is shared.
+            instance.name = f"{source.name}-{i + 1}"
+            instance.color = instance_color(i + 1)
+            instance.hide_render = False
+            source.users_collection[0].objects.link(instance)
+            instances.append(instance)
+
+        # The companions are only sources of instances.
+        for companion in self.companions:
+            companion.hide_render = True
+        return instances
+
+    def move_instances(self, instances: List, params: np.ndarray):
+        for instance, (x, y, z, rx, ry, rz, scale) in zip(instances, params.tolist()):
+            instance.location = (x, y, z)
+            instance.rotation_euler = (rx, ry, rz)
+            instance.scale = (scale, scale, scale)
+
+    def animate(self, camera, poses: np.ndarray, lights: np.ndarray, instances: List = (),
+                instances_params: np.ndarray = None, first_frame: int = 1):
+        Animator.keyframe(camera, "location", poses, first_frame)
+
+        for i in range(lights.shape[1]):
+            params = np.nan_to_num(lights[:, i])  # a light without a known kind stays off.
+            light = LightCreator.create_light(kind='POINT', color=(1, 1, 1), location=(0, 0, 0), energy=0)
+            Animator.keyframe(light, "location", params[:, 3:6], first_frame)
+            Animator.keyframe(light.data, "color", params[:, 0:3], first_frame)
+            Animator.keyframe(light.data, "energy", params[:, 6], first_frame)
+
+        for j, instance in enumerate(instances):
+            Animator.keyframe(instance, "location", instances_params[:, j, 0:3], first_frame)
+            Animator.keyframe(instance, "rotation_euler", instances_params[:, j, 3:6], first_frame)
+            Animator.keyframe(instance, "scale", np.repeat(instances_params[:, j, 6:7], 3, axis=1), first_frame)
+
+    def clear_animation(self, camera, instances: List = ()):
+        for id_data in (camera, *instances):
+            Animator.clear(id_data)
+        for light in [o for o in bpy.data.objects if o.type == 'LIGHT']:
+            Animator.clear(light.data)
+        self.clear_lights()
+
+    def load_hdris(self, paths: List[str]):
+        WorldRegistry.preload_hdris(paths)
+
+    def use_hdri(self, path: Optional[str]):
+        WorldRegistry.use_hdri(path)
+
+    def warm_up(self):
+        MaterialHandler.preload_materials()
+        LightEffect.global_illumination()
+        LightEffect.create_shadeless_world()
+
+    def is_alive(self, object_loaded):
+        try:
+            # A removed datablock raises on any access.
+            return bpy.data.objects.get(object_loaded.name) == object_loaded
+        except ReferenceError:
+            return False
+
+    def remove_object(self, object_loaded):
+        if object_loaded in self.companions:
+            self.companions.remove(object_loaded)
+        mesh = object_loaded.data
+        bpy.data.objects.remove(object_loaded, do_unlink=True)
+        if mesh is not None and mesh.users == 0:
+            bpy.data.meshes.remove(mesh)
 
 class Message:
     @staticmethod
@@ -663,7 +1429,8 @@ class Message:
         """
 
         def draw(self, _):
-            self.layout.label(text=message)
+            for line in message.splitlines():
+                self.layout.label(text=line)
             print(icon, title, message)
 
         bpy.context.window_manager.popup_menu(draw, title=title, icon=icon)
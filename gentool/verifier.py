@@ -0,0 +1,154 @@
+import csv
+import itertools
+import os
+import struct
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+
+from .estimator import count_viewpoints
+from .planner import JobPlan
+from .resample import Resampler
+from .tensors import PngReader
+from .translator import Config
+
+
+class Problem(NamedTuple):
+    object: str
+    index: int
+    style: str
+    reason: str
+
+
+class VerifyReport:
+    def __init__(self, objects: int, images: int, problems: List[Problem]):
+        self.objects = objects
+        self.images = images
+        self.problems = problems
+
+    @property
+    def ok(self) -> bool:
+        return not self.problems
+
+    def __str__(self):
+        lines = [f"{self.objects} objects, {self.images} images checked, {len(self.problems)} problems"]
+        lines += [f"{p.object}/{p.index}/{p.style}: {p.reason}" for p in self.problems[:20]]
+        if len(self.problems) > 20:
+            lines.append(f"... and {len(self.problems) - 20} more")
+        return "\n".join(lines)
+
+
+def check_image(path: str, width: int, height: int) -> Optional[str]:
+    """
+    Check a PNG without decoding it: the header, the size and that the file
+    ends with the IEND chunk, which a write cut by a crash does not have.
+    :return: the problem, None if the image is fine.
+    """
+    if not os.path.exists(path):
+        return "missing"
+    with open(path, "rb") as fr:
+        head = fr.read(24)
+        fr.seek(0, os.SEEK_END)
+        if fr.tell() < 24 + len(PngReader.IEND):
+            return "truncated"
+        fr.seek(-len(PngReader.IEND), os.SEEK_END)
+        tail = fr.read()
+
+    if not head.startswith(PngReader.SIGNATURE) or head[12:16] != b"IHDR":
+        return "not a PNG"
+    size = struct.unpack(">II", head[16:24])
+    if size != (width, height):
+        return f"size {size[0]}x{size[1]}, expected {width}x{height}"
+    if tail != PngReader.IEND:
+        return "truncated"
+    return None
+
+
+def verify_object(output_dir: str, name: str, styles: List[str], width: int, height: int,
+                  viewpoints: int, resolutions: List[List[int]] = ()) -> Tuple[int, List[Problem]]:
+    """
+    Check the csv and the images of an object.
+    :param viewpoints: expected amount of viewpoints.
+    :param resolutions: [width, height] of the smaller copies.
+    :return: amount of images checked and the problems found.
+    """
+    obj_path = os.path.join(output_dir, name)
+    csv_path = os.path.join(obj_path, f"{name}.csv")
+    indices: Set[int] = set()
+    if os.path.exists(csv_path):
+        with open(csv_path, "r", newline="") as f:
+            indices = {int(row['index']) for row in csv.DictReader(f)}
+
+    # Rows past the expected amount are checked as well, random viewpoints
+    # can not be counted before they are created.
+    problems = []
+    for index in sorted(indices.union(range(viewpoints))):
+        if index not in indices:
+            problems += [Problem(name, index, style, "no csv row") for style in styles]
+            continue
+        for style in styles:
+            image = os.path.join(obj_path, str(index), f"{style}.PNG")
+            reason = check_image(image, width, height)
+            # A copy is made again by rendering the style.
+            for w, h in resolutions:
+                reason = reason or check_image(Resampler.path(image, w, h), w, h)
+            if reason is not None:
+                problems.append(Problem(name, index, style, reason))
+
+    return len(indices) * len(styles) * (1 + len(resolutions)), problems
+
+
+class DatasetVerifier:
+    WORKERS = os.cpu_count() or 1
+
+    @staticmethod
+    def object_names(config: Config) -> List[str]:
+        """
+        The output folders of a config, in clutter scenes with several models
+        only the first object of each group has one.
+        """
+        e = config.environment
+        step = e.clutter_models if e.clutter and e.clutter_models > 1 else 1
+        return [obj.name for obj in itertools.islice(config.objects, 0, None, step)]
+
+    @staticmethod
+    def verify(config: Config, preview: bool = False, workers: int = WORKERS) -> VerifyReport:
+        """
+        Check that every expected viewpoint of every object has a csv row and
+        a complete image of each style, with a process per object at a time.
+        :param config: the Config that generated the dataset.
+        :param preview: if true, only 1 viewpoint is expected.
+        :param workers: amount of processes, 1 checks in this process.
+        """
+        r = config.render
+        names = DatasetVerifier.object_names(config)
+        viewpoints = 1 if preview else sum(count_viewpoints(v) for v in config.viewpoints)
+        args = [(r.output_dir_path, name, r.styles, r.resolution_x, r.resolution_y, viewpoints, r.resolutions)
+                for name in names]
+
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(verify_object, *zip(*args))) if args else []
+        else:
+            results = [verify_object(*a) for a in args]
+
+        return VerifyReport(len(names), sum(images for images, _ in results),
+                            [p for _, problems in results for p in problems])
+
+    @staticmethod
+    def repair(plan: JobPlan, problems: List[Problem]) -> JobPlan:
+        """
+        The jobs that render again the broken images, in place. The plan must
+        be expanded from the same config with the same seed as the dataset.
+        :param plan: the plan of the whole dataset.
+        :param problems: problems of a VerifyReport.
+        """
+        names = np.array([obj['name'] for obj in plan.objects])
+        broken = {(p.object, p.index, p.style) for p in problems}
+
+        table = plan.table
+        keys = zip(names[table['object']].tolist(), table['viewpoint'].tolist(),
+                   np.array(plan.styles)[table['style']].tolist())
+        return plan.subset(np.array([key in broken for key in keys], dtype=bool))
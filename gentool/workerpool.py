@@ -0,0 +1,248 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import traceback
+
+from multiprocessing.connection import Client, Listener, wait
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+from .planner import JobPlan
+from .translator import Config, ConfigIO, DataGenFunctsInterface, DatasetsGenerator, reconstruct, snapshot
+
+
+class RenderServer:
+    """
+    Long-lived render process, meant to run inside a headless Blender. The
+    template scene (camera, library materials, worlds) is built once and then
+    jobs are received over a local socket, so the cost per job is the render.
+
+    Requests are dicts with the config header, the object, the textures and
+    styles names and the jobs of the object; None stops the server.
+    """
+    AUTHKEY = "GENTOOL_WORKER_AUTHKEY"
+
+    def __init__(self, functs: DataGenFunctsInterface):
+        self.functs = functs
+        self.camera = None
+        self.generator = None
+        self.header = None
+
+    def warm_up(self):
+        self.functs.track_datablocks()
+        self.functs.warm_up()
+        self.camera = self.functs.create_camera()
+
+    def handle(self, request: Dict) -> int:
+        """
+        Render the jobs of a request.
+        :param request: the request.
+        :return: amount of jobs rendered.
+        """
+        obj = reconstruct(request['object'])
+        jobs = request['jobs']
+
+        # The generator is kept while the config does not change, so the
+        # benchmarks are loaded once.
+        header = json.dumps(request['config'], sort_keys=True)
+        if header != self.header:
+            config = ConfigIO.loads_header(request['config'], objects=[obj])
+            if self.generator is not None:
+                self.generator.close()
+            self.generator = DatasetsGenerator(config, self.functs, preview=False, plan=None)
+            self.functs.load_hdris(config.environment.hdris)
+            self.header = header
+        self.generator.plan = JobPlan([], request['textures'], request['styles'], jobs)
+
+        try:
+            self.generator.render_object(obj, [jobs], self.camera)
+        finally:
+            # Only the template scene stays, a failed job could have left
+            # the object, instances, rig cameras, lights or keyframes which
+            # would show in the renders of the next objects.
+            self.functs.clear_animation(self.camera)
+            self.functs.clear_objects(keep=[self.camera])
+            self.functs.purge_orphans()
+        self.generator.report_memory(obj)
+        self.generator.benchmarks.save(self.generator.benchmarks_path)
+        return len(jobs)
+
+    def serve(self, address: tuple, authkey: bytes):
+        """
+        Serve the requests of a single client until it sends None.
+        :param address: (host, port) to listen on.
+        :param authkey: key shared with the client.
+        """
+        self.warm_up()
+        with Listener(address, authkey=authkey) as listener:
+            print(f"Render worker listening on {address[0]}:{address[1]}")
+            with listener.accept() as connection:
+                while True:
+                    request = connection.recv()
+                    if request is None:
+                        if self.generator is not None:
+                            self.generator.close()
+                        return
+                    try:
+                        connection.send({'jobs': self.handle(request), 'error': None})
+                    except Exception:
+                        connection.send({'jobs': 0, 'error': traceback.format_exc()})
+
+    @staticmethod
+    def main():
+        """
+        Entry point of a worker, the arguments after "--" are host and port.
+        """
+        # Imported here since it needs bpy, the pool side does not.
+        from .utils import DataGenApplyFuncts
+
+        host, port = sys.argv[sys.argv.index("--") + 1:][:2]
+        authkey = bytes.fromhex(os.environ[RenderServer.AUTHKEY])
+        RenderServer(DataGenApplyFuncts()).serve((host, int(port)), authkey)
+
+
+def free_port(host: str) -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind((host, 0))
+        return s.getsockname()[1]
+
+
+class WorkerPool:
+    """
+    Pool of warm RenderServer processes. Jobs are sent object by object to
+    the first idle worker; the jobs of a worker that dies are sent again to
+    another one.
+    """
+    HOST = "localhost"
+    STARTUP_SECONDS = 300
+    RETRY_SECONDS = 0.5
+
+    def __init__(self, workers: int, blender: str, blend_file: str = ""):
+        """
+        :param workers: amount of Blender processes.
+        :param blender: Blender executable.
+        :param blend_file: .blend file opened by the workers, the assets paths
+        are relative to it.
+        """
+        assert workers > 0, "workers must be positive!"
+        self.authkey = os.urandom(16)
+        self.processes = []
+        self.connections = []
+
+        env = dict(os.environ)
+        env[RenderServer.AUTHKEY] = self.authkey.hex()
+        entry = f"import {__name__} as workerpool; workerpool.RenderServer.main()"
+
+        addresses = []
+        for _ in range(workers):
+            address = (WorkerPool.HOST, free_port(WorkerPool.HOST))
+            command = [blender, "-b", *([blend_file] if blend_file else []),
+                       "--python-expr", entry, "--", address[0], str(address[1])]
+            self.processes.append(subprocess.Popen(command, env=env))
+            addresses.append(address)
+
+        # Workers start in parallel, connect to them as they are ready.
+        for process, address in zip(self.processes, addresses):
+            self.connections.append(self._connect(process, address))
+
+    def _connect(self, process: subprocess.Popen, address: tuple):
+        deadline = time.time() + WorkerPool.STARTUP_SECONDS
+        while True:
+            try:
+                return Client(address, authkey=self.authkey)
+            except ConnectionRefusedError:
+                if process.poll() is not None or time.time() > deadline:
+                    self.close()
+                    raise RuntimeError(f"Render worker {address[1]} did not start")
+                time.sleep(WorkerPool.RETRY_SECONDS)
+
+    @staticmethod
+    def tasks(plan) -> Iterator[Tuple]:
+        """
+        A task per object with all its jobs, so a worker loads each model once.
+        """
+        for obj, batches in plan.object_jobs():
+            batches = list(batches)
+            if batches:
+                yield obj, np.concatenate(batches)
+
+    def run(self, config: Config, plan):
+        """
+        Render every job of a plan with the pool. The objects that fail do
+        not stop the others, they are reported at the end.
+        :param config: the Config
+        :param plan: the jobs to render, a planner.JobPlanner or a planner.JobPlan
+        :raise RuntimeError: if an object failed.
+        """
+        header = ConfigIO.dumps_header(config)
+        tasks = WorkerPool.tasks(plan)
+        failed: List[str] = []
+        retries: List = []
+        idle = list(self.connections)
+        busy = {}
+
+        while True:
+            while idle:
+                task = retries.pop() if retries else next(tasks, None)
+                if task is None:
+                    break
+                connection = idle.pop()
+                obj, jobs = task
+                connection.send({
+                    'config': header,
+                    'object': snapshot(obj),
+                    'textures': list(plan.textures),
+                    'styles': list(plan.styles),
+                    'jobs': jobs
+                })
+                busy[connection] = task
+
+            if not busy:
+                break
+
+            for connection in wait(list(busy)):
+                obj, jobs = task = busy.pop(connection)
+                try:
+                    reply = connection.recv()
+                except (EOFError, OSError):
+                    print(f"Render worker lost, {obj.name} is sent to another one")
+                    self.connections.remove(connection)
+                    retries.append(task)
+                    assert self.connections, "All the render workers were lost!"
+                    continue
+
+                if reply['error'] is not None:
+                    print(f"Error rendering {obj.name}:\n{reply['error']}")
+                    failed.append(obj.name)
+                idle.append(connection)
+
+        if failed:
+            raise RuntimeError(f"{len(failed)} objects failed to render: {', '.join(failed)}")
+
+    def close(self):
+        """
+        Stop the workers.
+        """
+        for connection in self.connections:
+            try:
+                connection.send(None)
+                connection.close()
+            except OSError:
+                pass
+        for process in self.processes:
+            try:
+                process.wait(timeout=WorkerPool.STARTUP_SECONDS)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self.connections = []
+        self.processes = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
@@ -1,8 +1,23 @@
+import os
+
+from typing import List, Optional
+
+import bpy
+
 from bpy.types import Operator
 
 from .gentool.basics import Environment, Object, Material, Viewpoint, Render, Light
-from .gentool.translator import ConfigIO, DatasetsGenerator, Config
-from .gentool.utils import (Cleaner, DataGenApplyFuncts, Message)
+from .gentool.benchmarks import Benchmarks
+from .gentool.catalog import Catalog
+from .gentool.estimator import Estimator
+from .gentool.jobqueue import JobQueue, QueueWorker
+from .gentool.planner import JobPlan, JobPlanner
+from .gentool.profiling import Profiler
+from .gentool.tensors import TensorExport
+from .gentool.translator import ConfigIO, DatasetsGenerator, Config, PreviewSession
+from .gentool.utils import (DataGenApplyFuncts, Message)
+from .gentool.verifier import DatasetVerifier
+from .gentool.workerpool import WorkerPool
 
 
 class OperatorsEnd:
@@ -13,8 +28,29 @@ class OperatorsEnd:
     INTERFACE = "INTERFACE"
 
 
+def parse_resolutions(text: str) -> List[List[int]]:
+    """
+    Parse the smaller resolutions field.
+    :param text: comma separated WIDTHxHEIGHT resolutions, e.g. "64x64, 32x32".
+    :return: list of [width, height]
+    """
+    resolutions = []
+    for resolution in text.replace(" ", "").lower().split(","):
+        if not resolution:
+            continue
+        sizes = resolution.split("x")
+        assert len(sizes) == 2 and all(size.isdigit() and int(size) > 0 for size in sizes), \
+            f"Resolution '{resolution}' is not WIDTHxHEIGHT with positive sizes!"
+        resolutions.append([int(size) for size in sizes])
+    return resolutions
+
+
 def create_config_from_gui(properties):
-    e = Environment(dimension=properties.scene_dimension)
+    e = Environment(
+        dimension=properties.scene_dimension,
+        clutter=properties.scene_clutter,
+        clutter_models=properties.scene_clutter_models
+    )
     m = Material(
         kind=properties.material_kind,
         texture=properties.choice_material
@@ -22,12 +58,19 @@ def create_config_from_gui(properties):
         # specular=properties.specular,
         # roughness=properties.roughness
     )
-    o = Object(
-        name='sample',
-        path=properties.input_model,
-        material=m,
-        normalize=properties.normalize
-    )
+    if Catalog.is_catalog(properties.input_model):
+        objects = Catalog(
+            source=properties.input_model,
+            material=m,
+            normalize=properties.normalize
+        )
+    else:
+        objects = [Object(
+            name='sample',
+            path=properties.input_model,
+            material=m,
+            normalize=properties.normalize
+        )]
     v = Viewpoint(
         kind=properties.camera_kind,
         location=properties.camera_location,
@@ -35,7 +78,10 @@ def create_config_from_gui(properties):
         size=properties.camera_size,
         horizontal_divisions=properties.camera_h_segments,
         vertical_divisions=properties.camera_v_segments,
-        max_range=properties.camera_range_location
+        max_range=properties.camera_range_location,
+        rig=properties.camera_rig,
+        rig_cameras=properties.camera_rig_cameras,
+        baseline=properties.camera_baseline
     )
 
     i = Light(
@@ -57,47 +103,85 @@ def create_config_from_gui(properties):
         styles.append(Render.Style.RAY_TRACED)
     if properties.style_rastered:
         styles.append(Render.Style.RASTERED)
+    if properties.style_instance_segmentation:
+        styles.append(Render.Style.INSTANCE_SEGMENTATION)
 
     r = Render(
         resolution_x=properties.render_resolution_x,
         resolution_y=properties.render_resolution_y,
         output_dir_path=properties.render_output_folder_path,
-        styles=styles
+        styles=styles,
+        animation=properties.render_animation,
+        resolutions=parse_resolutions(properties.render_resolutions)
     )
 
-    return Config(environment=e, render=r, objects=[o], lights=[i], viewpoints=[v])
+    return Config(environment=e, render=r, objects=objects, lights=[i], viewpoints=[v])
 
 
-def generate_renders(config: Config, preview: bool):
-    dataset_generator = DatasetsGenerator(
-        config=config,
-        functs=DataGenApplyFuncts(),
-        preview=preview
-    )
+def generate_renders(config: Config, preview: bool, queue_file: str = "", workers: int = 0, seed: int = 0,
+                     profiler: Profiler = None):
+    functs = DataGenApplyFuncts()
+    plan = JobPlanner(config=config, functs=functs, preview=preview, seed=seed or None)
+    if not preview and not queue_file:
+        # A queue saves the seed of its filler.
+        plan.save_seed()
 
-    dataset_generator.setName('Dataset-Generator')
-    dataset_generator.run()
+    queue = None
+    try:
+        if workers > 0 and not queue_file:
+            # Warm Blender processes render the jobs, this one only plans
+            # them, so there is nothing to profile here.
+            if profiler is not None:
+                print("Profiling is not available with workers, the renders run in other processes")
+            with WorkerPool(workers, blender=bpy.app.binary_path, blend_file=bpy.data.filepath) as pool:
+                pool.run(config, plan)
+            return
+
+        if queue_file:
+            # Every Blender process started on the same queue file is a worker,
+            # one of them also fills the queue as the jobs are claimed.
+            queue = JobQueue(queue_file)
+            plan = QueueWorker(queue, planner=plan)
+
+        dataset_generator = DatasetsGenerator(
+            config=config,
+            functs=functs,
+            preview=preview,
+            plan=plan,
+            profiler=profiler
+        )
+
+        dataset_generator.setName('Dataset-Generator')
+        dataset_generator.run()
+    finally:
+        if queue is not None:
+            queue.close()
+        if profiler is not None:
+            profiler.close()
 
 
 class OP_OT_GenerateScene(Operator):
     """
     This class shows to the user the created objects where all generation
-    will proceed.
+    will proceed. The scene is kept between previews, so only the parts of the
+    config that changed are rebuilt.
     """
     bl_label = "Render a Sample"
     bl_idname = "object.generate_scene"
 
+    session = PreviewSession(functs=DataGenApplyFuncts())
+
     def execute(self, context):
         try:
             config = create_config_from_gui(context.scene.tool)
-            generate_renders(config, preview=True)
+            OP_OT_GenerateScene.session.render(config)
             Message.show(
                 title="Information",
                 message="Rendering the preview",
                 icon='INFO'
             )
         except Exception as e:
-            Cleaner.clear_scene()
+            OP_OT_GenerateScene.session.close()
             Message.show(
                 title="Operation Canceled",
                 message=str(e),
@@ -116,7 +200,60 @@ class OP_OT_ClearScene(Operator):
     bl_idname = "object.clear_scene"
 
     def execute(self, _):
-        Cleaner.clear_scene()
+        OP_OT_GenerateScene.session.close()
+        return {OperatorsEnd.FINISHED}
+
+
+def repair_plan_path(config: Config) -> str:
+    return os.path.join(config.render.output_dir_path, "repair.npz")
+
+
+def create_config(tool) -> Config:
+    return ConfigIO.loads(tool.input_presets_file) if tool.choice_render == 'FILE' \
+        else create_config_from_gui(tool)
+
+
+def create_config_or_cancel(tool) -> Optional[Config]:
+    """
+    create_config, showing the error instead of raising it.
+    :return: the config, None if it is not valid.
+    """
+    try:
+        return create_config(tool)
+    except Exception as e:
+        Message.show(
+            title="Operation Canceled",
+            message=str(e),
+            icon='ERROR'
+        )
+        return None
+
+
+class OP_OT_EstimateDataset(Operator):
+    """
+    Dry-run: expands the config without rendering and reports the amount of
+    images per style, the predicted time and the disk usage.
+    """
+    bl_label = "Estimate"
+    bl_idname = "object.estimate_dataset"
+
+    def execute(self, context):
+        tool = context.scene.tool
+        try:
+            estimate = Estimator.estimate(create_config(tool), Benchmarks.load(tool.benchmarks_file))
+        except Exception as e:
+            Message.show(
+                title="Operation Canceled",
+                message=str(e),
+                icon='ERROR'
+            )
+            return {OperatorsEnd.CANCELLED}
+
+        Message.show(
+            title="Estimation",
+            message=str(estimate),
+            icon='INFO'
+        )
         return {OperatorsEnd.FINISHED}
 
 
@@ -127,10 +264,101 @@ class OP_OT_GenerateDataset(Operator):
 
     def execute(self, context):
         tool = context.scene.tool
-        input_path = tool.input_presets_file
+        config = create_config_or_cancel(tool)
+        if config is None:
+            return {OperatorsEnd.CANCELLED}
+        # The generator owns the whole scene, drop any preview state.
+        OP_OT_GenerateScene.session.close()
+        profiler = Profiler(tool.profile_dir, every=tool.profile_every,
+                            memory=tool.profile_memory) if tool.profile_dir else None
+        generate_renders(config, preview=False, queue_file=tool.queue_file, workers=tool.workers,
+                         seed=tool.seed, profiler=profiler)
+
+        return {OperatorsEnd.FINISHED}
 
-        config = ConfigIO.json_loads(input_path) if tool.choice_render == 'FILE' \
-            else create_config_from_gui(tool)
-        generate_renders(config, preview=False)
 
+class OP_OT_ExportTensors(Operator):
+    """
+    Packs the rendered images of each style into a memory-mapped .npy, read
+    by the training data loaders without decoding the PNGs.
+    """
+    bl_label = "Export tensors"
+    bl_idname = "object.export_tensors"
+
+    def execute(self, context):
+        config = create_config_or_cancel(context.scene.tool)
+        if config is None:
+            return {OperatorsEnd.CANCELLED}
+        missing = TensorExport.export(config.render.output_dir_path, config.render.styles)
+
+        Message.show(
+            title="Tensors exported",
+            message=", ".join(f"{style}: {amount} missing" for style, amount in missing.items()),
+            icon='INFO'
+        )
+        return {OperatorsEnd.FINISHED}
+
+
+class OP_OT_VerifyDataset(Operator):
+    """
+    Checks the csv rows and the images of every object of the dataset, and
+    saves the jobs that render the broken ones again.
+    """
+    bl_label = "Verify"
+    bl_idname = "object.verify_dataset"
+
+    def execute(self, context):
+        tool = context.scene.tool
+        config = create_config_or_cancel(tool)
+        if config is None:
+            return {OperatorsEnd.CANCELLED}
+        report = DatasetVerifier.verify(config)
+        message = str(report)
+
+        if not report.ok:
+            # The same seed as the dataset gives the same jobs, the one in the
+            # panel could have changed since.
+            seed = JobPlanner.load_seed(config.render.output_dir_path)
+            if seed is None:
+                message += "\nSeed unknown, the dataset can not be repaired"
+            else:
+                plan = JobPlanner(config=config, functs=DataGenApplyFuncts(), preview=False, seed=seed)
+                repair = DatasetVerifier.repair(plan.plan(), report.problems)
+                repair.save(repair_plan_path(config))
+                print(f"{len(repair)} repair jobs saved to {repair_plan_path(config)}")
+
+        Message.show(
+            title="Verification",
+            message=message,
+            icon='INFO' if report.ok else 'ERROR'
+        )
+        return {OperatorsEnd.FINISHED}
+
+
+class OP_OT_RepairDataset(Operator):
+    """
+    Renders in place the jobs saved by the verification.
+    """
+    bl_label = "Repair"
+    bl_idname = "object.repair_dataset"
+
+    def execute(self, context):
+        config = create_config_or_cancel(context.scene.tool)
+        if config is None:
+            return {OperatorsEnd.CANCELLED}
+        path = repair_plan_path(config)
+        if not os.path.exists(path):
+            Message.show(
+                title="Operation Canceled",
+                message="Nothing to repair, verify the dataset first",
+                icon='ERROR'
+            )
+            return {OperatorsEnd.CANCELLED}
+
+        OP_OT_GenerateScene.session.close()
+        try:
+            DatasetsGenerator(config=config, functs=DataGenApplyFuncts(), preview=False, plan=JobPlan.load(path)).run()
+        finally:
+            # A failed repair is verified again, the problems could have changed.
+            os.remove(path)
         return {OperatorsEnd.FINISHED}
@@ -1,6 +1,7 @@
 from bpy.types import Panel
 
-from .operators import OP_OT_ClearScene, OP_OT_GenerateDataset, OP_OT_GenerateScene
+from .operators import (OP_OT_ClearScene, OP_OT_EstimateDataset, OP_OT_ExportTensors, OP_OT_GenerateDataset,
+                        OP_OT_GenerateScene, OP_OT_RepairDataset, OP_OT_VerifyDataset)
 
 
 class ToolPanel:
@@ -42,6 +43,9 @@ class PL_PT_gui(ToolPanel, Panel):
         layout.label(text="Scene option:")
         row = layout.row()
         row.prop(tool, "scene_dimension")
+        row = layout.row()
+        row.prop(tool, "scene_clutter")
+        row.prop(tool, "scene_clutter_models")
 
         # Model Options
         layout.separator()
@@ -77,6 +81,10 @@ class PL_PT_gui(ToolPanel, Panel):
         row.prop(tool, 'camera_size')
         row.prop(tool, 'camera_h_segments')
         row.prop(tool, 'camera_v_segments')
+        row = layout.row()
+        row.prop(tool, 'camera_rig')
+        row.prop(tool, 'camera_rig_cameras')
+        row.prop(tool, 'camera_baseline')
 
         # Render Manager options
         layout.separator()
@@ -89,14 +97,17 @@ class PL_PT_gui(ToolPanel, Panel):
         row.prop(tool, 'style_ray_traced')
         row = layout.row()
         row.prop(tool, 'style_rastered')
+        row.prop(tool, 'style_instance_segmentation')
 
+        layout.prop(tool, 'render_animation')
         layout.prop(tool, 'render_resolution_x')
         layout.prop(tool, 'render_resolution_y')
+        layout.prop(tool, 'render_resolutions')
         layout.prop(tool, 'render_output_folder_path')
 
         layout.separator()
         preview_row = layout.row()
-        # preview_row.operator(OP_OT_GenerateScene.bl_idname)
+        preview_row.operator(OP_OT_GenerateScene.bl_idname)
         preview_row.operator(OP_OT_ClearScene.bl_idname)
 
 
@@ -127,5 +138,18 @@ class PL_PT_generator(ToolPanel, Panel):
         tool = context.scene.tool
 
         layout.prop(tool, "choice_render")
+        layout.prop(tool, "seed")
+        layout.prop(tool, "benchmarks_file")
+        layout.prop(tool, "queue_file")
+        layout.prop(tool, "workers")
+        layout.prop(tool, "profile_dir")
+        layout.prop(tool, "profile_every")
+        layout.prop(tool, "profile_memory")
         layout.separator()
-        layout.operator(OP_OT_GenerateDataset.bl_idname)
+        row = layout.row()
+        row.operator(OP_OT_EstimateDataset.bl_idname)
+        row.operator(OP_OT_GenerateDataset.bl_idname)
+        row = layout.row()
+        row.operator(OP_OT_VerifyDataset.bl_idname)
+        row.operator(OP_OT_RepairDataset.bl_idname)
+        layout.operator(OP_OT_ExportTensors.bl_idname)
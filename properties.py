@@ -25,10 +25,26 @@ class Properties(PropertyGroup):
         min=1
     )
 
+    scene_clutter: IntProperty(
+        name="Clutter instances",
+        description="Linked copies of the models placed around the object with a random pose in each viewpoint. "
+                    "If 0, the object is rendered alone",
+        default=0,
+        min=0
+    )
+
+    scene_clutter_models: IntProperty(
+        name="Clutter models",
+        description="Models of each clutter scene: the object and the next ones of the catalog",
+        default=1,
+        min=1
+    )
+
     # Model properties:
     input_model: StringProperty(
         name="Input file",
-        description="Choose a 3D model to import",
+        description="Choose a 3D model to import (.obj, .ply, .stl, .gltf or .glb). A folder, a glob pattern (models/**/*.obj) or a "
+                    "manifest file (.txt) with one model path per line imports the whole catalog",
         default="*.obj",
         maxlen=1024,
         subtype='FILE_PATH'
@@ -94,7 +110,7 @@ class Properties(PropertyGroup):
         name="Light energy",
         description="Set the intensity of the light",
         min=0,
-        default=10
+        default=1000
     ) 
 
     light_kind: EnumProperty(
@@ -146,7 +162,9 @@ class Properties(PropertyGroup):
             (Viewpoint.Kind.STATIC_CAMERA, 'Static', 'Generate the camera in a fixed location', '', 0),
             (Viewpoint.Kind.DYNAMIC_CAMERA, 'Dynamic', 'Generate the camera at random location', '', 1),
             (Viewpoint.Kind.OBJECT_PATH, 'Spheric path',
-             'Generate the camera to follow the vertices produced in a sphere', '', 2)
+             'Generate the camera to follow the vertices produced in a sphere', '', 2),
+            (Viewpoint.Kind.CAMERA_RIG, 'Camera rig',
+             'Generate rigs of cameras at random locations, the cameras of a rig see the same scene', '', 3)
         ],
         default=Viewpoint.Kind.DYNAMIC_CAMERA
     )
@@ -196,6 +214,30 @@ class Properties(PropertyGroup):
         min=0
     )
 
+    camera_rig: EnumProperty(
+        name="Rig",
+        description="Cameras of each rig pose",
+        items=[
+            (Viewpoint.Rig.STEREO, 'Stereo', 'A left and a right camera, baseline apart', '', 0),
+            (Viewpoint.Rig.RING, 'Ring', 'Cameras evenly spaced on the horizontal circle through the pose', '', 1)
+        ],
+        default=Viewpoint.Rig.STEREO
+    )
+
+    camera_rig_cameras: IntProperty(
+        name="Rig cameras",
+        description="Amount of cameras of a ring rig",
+        default=4,
+        min=1
+    )
+
+    camera_baseline: FloatProperty(
+        name="Baseline",
+        description="Distance between the cameras of a stereo rig",
+        default=0.1,
+        min=0
+    )
+
     # RenderManager settings
     style_normal: BoolProperty(
         name="No-style rendering",
@@ -227,6 +269,19 @@ class Properties(PropertyGroup):
         default=True,
     )
 
+    style_instance_segmentation: BoolProperty(
+        name="Instance segmentation rendering",
+        description="Renders every instance of a clutter scene with a different flat color",
+        default=False,
+    )
+
+    render_animation: BoolProperty(
+        name="Render as animation",
+        description="Keyframe the viewpoints of each object and render every style with a single animation "
+                    "render, instead of a render per viewpoint",
+        default=False,
+    )
+
     render_resolution_x: IntProperty(
         name="Width",
         description="Sets the width of the output images in pixels",
@@ -242,6 +297,13 @@ class Properties(PropertyGroup):
         min=0
     )
 
+    render_resolutions: StringProperty(
+        name="Smaller resolutions",
+        description="Comma separated WIDTHxHEIGHT resolutions, e.g. '64x64, 32x32'. Every image is also "
+                    "written downsampled to each one as '<style>_<width>x<height>.PNG'",
+        default=""
+    )
+
     render_output_folder_path: StringProperty(
         name="Output directory",
         description="Choose a directory where output will appears",
@@ -253,16 +315,79 @@ class Properties(PropertyGroup):
     # Json file input
     input_presets_file: StringProperty(
         name="Input config file",
-        description="Configuration file for scene creation and customization",
+        description="Configuration file for scene creation and customization, in .json or .jsonl format "
+                    "(a header line and then one object per line)",
         default="*.json",
         maxlen=1024,
         subtype='FILE_PATH'
     )
 
+    # Seed of the light, material and clutter samples
+    seed: IntProperty(
+        name="Seed",
+        description="Seed of the sampled lights and clutter poses, the sampled values are saved in the "
+                    "objects csv. If 0, a random seed is used",
+        default=0,
+        min=0
+    )
+
+    # Benchmarks file for estimations
+    benchmarks_file: StringProperty(
+        name="Benchmarks file",
+        description="Render timings used to estimate a run. Each run writes the measured ones to "
+                    "'benchmarks.json' in its output directory. If empty, default timings are used",
+        default="",
+        maxlen=1024,
+        subtype='FILE_PATH'
+    )
+
+    # Job queue shared by several generator processes
+    queue_file: StringProperty(
+        name="Job queue file",
+        description="SQLite file with the jobs of the run. Every process generating with the same file "
+                    "renders part of the jobs, so processes can be added or killed at any time. "
+                    "If empty, this process renders every job",
+        default="",
+        maxlen=1024,
+        subtype='FILE_PATH'
+    )
+
+    # Warm Blender processes rendering the jobs
+    workers: IntProperty(
+        name="Render workers",
+        description="Headless Blender processes that load the materials and worlds once and then "
+                    "render the jobs sent by this one. If 0, this process renders every job. "
+                    "Not used with a job queue file",
+        default=0,
+        min=0
+    )
+
+    # Profiling of the run
+    profile_dir: StringProperty(
+        name="Profiling folder",
+        description="If set, a cProfile '<object>.pstats' is saved for each object to this folder",
+        default="",
+        maxlen=1024,
+        subtype='DIR_PATH'
+    )
+
+    profile_every: IntProperty(
+        name="Profile every",
+        description="Profile only every Nth viewpoint, to keep a low overhead. If 1, the whole objects are profiled",
+        default=1,
+        min=1
+    )
+
+    profile_memory: BoolProperty(
+        name="Memory snapshots",
+        description="Save a tracemalloc snapshot between objects and print the biggest memory growths",
+        default=False
+    )
+
     # Generator panel settings
     choice_render: EnumProperty(
         name="Config from",
-        description="Choose the generator input, if you choose GUI the generator will take the established properties, if you choose FILE, the generator will take the properties of a file in *.json format",
+        description="Choose the generator input, if you choose GUI the generator will take the established properties, if you choose FILE, the generator will take the properties of a file in *.json or *.jsonl format",
         items=[
             ('GUI', 'Gui', '', '', 0),
             ('FILE', 'File', '', '', 1)